@@ -6,9 +6,9 @@ from nltk.corpus import wordnet as wn
 #documentation
 #https://www.nltk.org/api/nltk.corpus.reader.sentiwordnet.html
 
-nltk.download('sentiwordnet', quiet=True)
-nltk.download('wordnet', quiet=True)
-nltk.download('averaged_perceptron_tagger_eng', quiet=True)
+#checking for the corpora and POS tagger on disk (no downloads, see nltk_resources.py)
+from nltk_resources import require
+require('sentiwordnet', 'wordnet', 'tagger')
 
 def get_wordnet_pos(treebank_tag: str) -> str:
     """
@@ -7,6 +7,66 @@ Usage by future components:
     from basic_preprocess import preprocess_data
     df = preprocess_data()
 
+SentiWordNet normalization (the slowest step) can run on a process pool:
+    df = preprocess_data(df, n_jobs=-1)
+
+Text columns can be cleaned column-wise instead of row by row:
+    from basic_preprocess import basic_text_clean_batch, preprocess_for_swn_batch
+    vader = basic_text_clean_batch(df["combined_text"])
+    swn = preprocess_for_swn_batch(vader, cleaned=True)
+
+clean_swn can be stored as int32 vocabulary ids (token_table.TokenArray) instead of
+a Python list per row; rows still read back as lists:
+    df = preprocess_data(df, token_ids=True)
+
+Near-duplicate reviews (templated or copy-pasted text, found with MinHash/LSH in
+dedup.py) can be flagged or collapsed after exact deduplication:
+    df = preprocess_data(df, near_dups="flag")      #near_dup_cluster / is_near_dup columns
+    df = preprocess_data(df, near_dups="collapse")  #keeps the first review of each cluster
+
+Chunked runs can deduplicate across chunks by sharing a set of key hashes
+(8 bytes per distinct review instead of the review text):
+    seen = SeenHashes()
+    for chunk in load_data_iter(chunksize=100_000):
+        part = preprocess_data(chunk, seen=seen)
+
+Outlier bounds for chunked runs come from a first pass that fills a mergeable
+quantile sketch (sketch.py), instead of the quantiles of each chunk:
+    sketch = KLLSketch()
+    for chunk in load_data_iter(chunksize=100_000):
+        word_count_sketch(chunk, sketch)
+    bounds = iqr_bounds(sketch)
+    for chunk in load_data_iter(chunksize=100_000):
+        part = preprocess_data(chunk, seen=seen, outlier_bounds=bounds)
+
+Samples can be stratified (per-stratum quotas, or proportional to stratum sizes), and
+drawn from a chunk stream in one pass holding only the sample:
+    sample = sample_data(df, n=1000, stratify="sentiment")
+    sample = sample_data(df, stratify="overall", quotas={1.0: 200, 5.0: 200})
+    chunks = (preprocess_data(chunk, seen=seen) for chunk in load_data_iter())
+    sample = reservoir_sample(chunks, n=1000, random_seed=7, stratify="sentiment")
+
+Lexicon evaluations on a sample can skip normalizing the rows they throw away:
+    sample = preprocess_sample(df, n=1000)   #== sample_data(preprocess_data(df), n=1000)
+
+Pipelines that read only one text column can skip building the other; it is left
+lazy (lazy_frame.LazyFrame) and built on first access:
+    df = preprocess_data(df, features=["clean_swn"])
+    df["clean_vader"]   #computed now
+
+Repeated runs over the same data can start from the preprocessed-data cache
+(preprocess_cache.py: Arrow files in Data/.cache/, keyed by the input data, the
+parameters and this code, size-bounded with least recently used eviction):
+    df = preprocess_data(df, token_ids=True, cache=True)
+    sample = preprocess_sample(df, n=1000, cache=True)
+
+NLTK data is checked on disk when first needed and never downloaded at run time
+(nltk_resources.py); install it once with:
+    python nltk_resources.py bootstrap
+
+Lemmas are memoized (LEMMA_CACHE): a bounded in-memory LRU in front of a SQLite
+file in Data/.cache/ keyed by the installed WordNet data, so warm runs skip WordNet.
+
 Usage as standalone to see output and generate figures:
     cd "COMP262_PROJECT_GRP1/Phase 1"
     python basic_preprocess.py
@@ -15,34 +75,44 @@ Usage as standalone to see output and generate figures:
 #Importing Libraries
 import os
 import re
+import sqlite3
 import string
+import functools
+import hashlib
+from collections import OrderedDict
+from importlib import metadata
+from typing import Iterable
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import numpy as np
-import matplotlib
-matplotlib.use("Agg")
-import matplotlib.pyplot as plt
-import seaborn as sns
-import nltk
-from nltk.corpus import stopwords
-from nltk.stem import WordNetLemmatizer
-
-#Importing loader function
-from loader import load_data
+#matplotlib and NLTK are imported where they are first needed (generate_figures and the
+#NLTK resource helpers below), so importing this module as a library stays fast
+
+#Importing loader function, compact token storage and near-duplicate detection
+from loader import load_data, resolve_n_jobs
+from token_table import TokenArray
+from dedup import find_near_duplicates, near_duplicate_stats, report_near_duplicates
+from dedup import SeenHashes, dedup_key_hashes
+from sketch import KLLSketch
+from lazy_frame import LazyFrame
+from preprocess_cache import cache_key, code_version, read_frame, write_frame
+from nltk_resources import require, fingerprint
 
 #================================================================
 #Set Up
 #================================================================
-#Creating folder to hold figures
+#Lexicon text columns preprocess_data can build, in build order (features= picks a subset)
+TEXT_FEATURES = ("clean_vader", "clean_swn")
+
+#Folder to hold figures (created by generate_figures)
 FIGURES_FOLDER = os.path.join(os.path.dirname(__file__), "figures")
-if not os.path.exists(FIGURES_FOLDER):
-    os.makedirs(FIGURES_FOLDER)
 
 #Defining reusable constants
 PALETTE = "viridis"
 SEPARATOR = "-" * 64
 
-#Setting plt style
-plt.style.use("seaborn-v0_8-whitegrid")
+#plt style for generate_figures
+PLOT_STYLE = "seaborn-v0_8-whitegrid"
 
 #Defining colors for sentiment categories
 SENTIMENT_COLORS = {
@@ -50,8 +120,220 @@ SENTIMENT_COLORS = {
     "Neutral" : "#DD8452",
     "Negative": "#C44E52",
 }
-STOP_WORDS = set(stopwords.words("english"))
-LEMMATIZER = WordNetLemmatizer()
+#Tokenizer used by preprocess_for_swn: "fast" (whitespace split) or "nltk" (word_tokenize)
+#benchmark.py tokenizer reports how often they differ - 0 of 3,176 fashion reviews
+SWN_TOKENIZER = "fast"
+
+#Words NLTK's contraction rules need (see _contraction_patterns): a plain substring
+#check is far cheaper than running the regexes on every review
+CONTRACTION_HINTS = ("cannot", "gimme", "gonna", "gotta", "lemme", "wanna")
+
+#Every character Python's \s matches, spelled out so the patterns below behave the same
+#under pandas' Arrow (RE2) string engine, whose \s and \S only know ASCII whitespace
+WHITESPACE_CLASS = "\\s\\v\x1c-\x1f\x85\xa0\u1680\u2000-\u200a\u2028\u2029\u202f\u205f\u3000"
+
+#Compiled once for basic_text_clean; the batch versions pass the same pattern strings to pandas
+URL_PATTERN = re.compile(f"http[^{WHITESPACE_CLASS}]+|www\\.[^{WHITESPACE_CLASS}]+")
+WHITESPACE_PATTERN = re.compile(f"[{WHITESPACE_CLASS}]+")
+
+#Translation table deleting ASCII punctuation for SWN text
+PUNCT_TABLE = str.maketrans("", "", string.punctuation)
+
+#In-memory LRU size (tokens) and on-disk location of the lemma cache (None = memory only)
+LEMMA_CACHE_SIZE = 200_000
+LEMMA_CACHE_DIR = os.path.join(os.path.dirname(__file__), "Data", ".cache")
+
+#New lemmas buffered before they are written to the on-disk tier
+LEMMA_FLUSH_SIZE = 10_000
+
+#Tokens looked up per on-disk query (SQLite allows 999 parameters on older builds)
+LEMMA_QUERY_SIZE = 900
+
+#Text chunks per worker in parallel SWN normalization - more than one evens out uneven chunks
+CHUNKS_PER_JOB = 4
+
+
+class LemmaCache:
+    """
+    Token -> lemma memo in front of the WordNet lemmatizer.
+    The first tier is a bounded in-memory LRU, the second an optional SQLite file
+    named after a fingerprint of the installed WordNet data, so lemmas from earlier
+    runs never hit WordNet. lemmatize_many resolves a whole batch of misses with one
+    query per LEMMA_QUERY_SIZE tokens.
+    """
+
+    def __init__(self, maxsize: int = LEMMA_CACHE_SIZE, cache_dir: str | None = LEMMA_CACHE_DIR):
+        self.maxsize = maxsize
+        self.cache_dir = cache_dir
+        self.lookups = 0
+        self.disk_hits = 0
+        self.wordnet_calls = 0
+        self._memory = OrderedDict()
+        self._db = None
+        self._db_pid = None
+        self._pending = {}
+
+    def lemmatize(self, token: str) -> str:
+        """
+        Lemma of one token.
+        """
+        self.lookups += 1
+        lemma = self._memory.get(token)
+        if lemma is None:
+            return self._resolve([token])[token]
+        self._memory.move_to_end(token)
+        return lemma
+
+    def lemmatize_many(self, tokens) -> dict:
+        """
+        Token -> lemma for every distinct token in tokens, counted as one lookup per token.
+        Tokens missing from memory are looked up on disk together, WordNet only sees the rest.
+        """
+        tokens = list(tokens)
+        self.lookups += len(tokens)
+        lemmas, misses = {}, []
+        for token in dict.fromkeys(tokens):
+            lemma = self._memory.get(token)
+            if lemma is None:
+                misses.append(token)
+            else:
+                self._memory.move_to_end(token)
+                lemmas[token] = lemma
+        if misses:
+            lemmas.update(self._resolve(misses))
+        return lemmas
+
+    def _resolve(self, tokens: list) -> dict:
+        """
+        Lemmas of distinct tokens not in memory, from the on-disk tier or WordNet, added to memory.
+        """
+        found = {}
+        db = self._connect()
+        if db is not None:
+            for start in range(0, len(tokens), LEMMA_QUERY_SIZE):
+                batch = tokens[start:start + LEMMA_QUERY_SIZE]
+                found.update(db.execute(
+                    f"SELECT token, lemma FROM lemmas WHERE token IN ({', '.join('?' * len(batch))})", batch,
+                ))
+            self.disk_hits += len(found)
+
+        for token in tokens:
+            if token not in found:
+                self.wordnet_calls += 1
+                found[token] = _lemmatizer().lemmatize(token)
+                if db is not None:
+                    self._pending[token] = found[token]
+
+        self._memory.update(found)
+        while len(self._memory) > self.maxsize:
+            self._memory.popitem(last=False)
+        if len(self._pending) >= LEMMA_FLUSH_SIZE:
+            self.flush()
+        return found
+
+    def _connect(self):
+        """
+        Opening the on-disk tier on first use (again in each worker process,
+        since SQLite connections must not cross a fork).
+        """
+        if self.cache_dir is None:
+            return None
+        if self._db is None or self._db_pid != os.getpid():
+            require("wordnet")
+            #Named after where WordNet is installed and its size and mtime, read without loading the corpus
+            stamp = fingerprint("wordnet")["wordnet"]
+            version = hashlib.blake2b(stamp.encode(), digest_size=8).hexdigest()
+            os.makedirs(self.cache_dir, exist_ok=True)
+            db_path = os.path.join(self.cache_dir, f"lemmas-wordnet-{version}.sqlite")
+            self._db = sqlite3.connect(db_path, timeout=60)
+            self._db.execute("CREATE TABLE IF NOT EXISTS lemmas (token TEXT PRIMARY KEY, lemma TEXT)")
+            self._db_pid = os.getpid()
+            self._pending = {}
+        return self._db
+
+    def flush(self) -> None:
+        """
+        Writing buffered new lemmas to the on-disk tier.
+        """
+        if self._pending and self._connect() is not None:
+            with self._db:
+                self._db.executemany(
+                    "INSERT OR IGNORE INTO lemmas (token, lemma) VALUES (?, ?)",
+                    self._pending.items(),
+                )
+            self._pending = {}
+
+    def stats(self) -> dict:
+        """
+        Lookup counts per tier since the cache was created.
+        """
+        return {
+            "lookups": self.lookups,
+            "memory_hits": self.lookups - self.disk_hits - self.wordnet_calls,
+            "disk_hits": self.disk_hits,
+            "wordnet_calls": self.wordnet_calls,
+        }
+
+    def report(self, stats: dict | None = None) -> None:
+        """
+        Printing hit rates for each tier.
+        """
+        stats = stats or self.stats()
+        lookups = max(stats["lookups"], 1)
+        print(f"Lemma cache: {stats['lookups']:,} lookups  "
+              f"memory {stats['memory_hits'] / lookups:.1%}  "
+              f"disk {stats['disk_hits'] / lookups:.1%}  "
+              f"WordNet {stats['wordnet_calls'] / lookups:.1%}")
+
+
+LEMMA_CACHE = LemmaCache()
+
+
+#================================================================
+#NLTK resources (loaded on first use, checked on disk by nltk_resources - never downloaded)
+#================================================================
+@functools.cache
+def _stop_words() -> set:
+    require("stopwords")
+    from nltk.corpus import stopwords
+    return set(stopwords.words("english"))
+
+
+@functools.cache
+def _lemmatizer():
+    require("wordnet")
+    from nltk.stem import WordNetLemmatizer
+    return WordNetLemmatizer()
+
+
+@functools.cache
+def _contraction_patterns() -> list:
+    """
+    NLTK's contraction rules ("cannot" -> "can not", "gonna" -> "gon na", ...), the only
+    word_tokenize rules that split depunctuated ASCII text without apostrophes.
+    """
+    from nltk.tokenize import NLTKWordTokenizer
+    return NLTKWordTokenizer.CONTRACTIONS2 + NLTKWordTokenizer.CONTRACTIONS3
+
+
+def _word_tokenize(text: str) -> list[str]:
+    require("punkt")
+    import nltk
+    return nltk.word_tokenize(text)
+
+
+#Module attributes that used to be built at import time, now built on first access
+_LAZY_ATTRIBUTES = {
+    "STOP_WORDS": _stop_words,
+    "LEMMATIZER": _lemmatizer,
+    "CONTRACTION_PATTERNS": _contraction_patterns,
+}
+
+
+def __getattr__(name: str):
+    if name in _LAZY_ATTRIBUTES:
+        return _LAZY_ATTRIBUTES[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def basic_text_clean(text: str) -> str:
@@ -61,11 +343,20 @@ def basic_text_clean(text: str) -> str:
     if pd.isna(text):
         return ""
     text = str(text)
-    text = re.sub(r"http\S+|www\.\S+", " ", text)
-    text = re.sub(r"\s+", " ", text).strip()
+    text = URL_PATTERN.sub(" ", text)
+    text = WHITESPACE_PATTERN.sub(" ", text).strip()
     return text
 
 
+def basic_text_clean_batch(texts: pd.Series) -> pd.Series:
+    """
+    Column-wise basic_text_clean: the same output, using pandas string methods instead of a per-row apply.
+    """
+    texts = texts.fillna("").astype("str")
+    texts = texts.str.replace(URL_PATTERN.pattern, " ", regex=True)
+    return texts.str.replace(WHITESPACE_PATTERN.pattern, " ", regex=True).str.strip(" ")
+
+
 def preprocess_for_vader(text: str) -> str:
     """
     Minimal preprocessing for VADER, which relies on punctuation and casing cues.
@@ -73,104 +364,437 @@ def preprocess_for_vader(text: str) -> str:
     return basic_text_clean(text)
 
 
-def preprocess_for_swn(text: str) -> list[str]:
+def tokenize_fast(text: str) -> list[str]:
+    """
+    Whitespace tokenizer for depunctuated SWN text that gives the same tokens as nltk.word_tokenize.
+    Text with non-ASCII characters (curly quotes, dashes) or apostrophes still goes through NLTK.
+    """
+    if not text.isascii() or "'" in text:
+        return _word_tokenize(text)
+    lowered = text.lower()
+    if any(hint in lowered for hint in CONTRACTION_HINTS):
+        text = f" {text} "
+        for regexp in _contraction_patterns():
+            text = regexp.sub(r" \1 \2 ", text)
+    return text.split()
+
+
+def _resolve_tokenizer(tokenizer: str | None):
+    """
+    Mapping a tokenizer name ("fast" or "nltk", defaults to SWN_TOKENIZER) to its function.
+    """
+    tokenizer = tokenizer or SWN_TOKENIZER
+    if tokenizer not in ("fast", "nltk"):
+        raise ValueError(f"Unknown tokenizer {tokenizer!r}, expected 'fast' or 'nltk'")
+    return tokenize_fast if tokenizer == "fast" else _word_tokenize
+
+
+def preprocess_for_swn(text: str, tokenizer: str | None = None) -> list[str]:
     """
     Full linguistic normalization is required for lexicon matching in SentiWordNet pipelines.
+    tokenizer is "fast" or "nltk" (defaults to SWN_TOKENIZER).
     """
-    cleaned = basic_text_clean(text).lower()
-    cleaned = cleaned.translate(str.maketrans("", "", string.punctuation))
-    tokens = nltk.word_tokenize(cleaned)
-    processed_tokens = [LEMMATIZER.lemmatize(token) for token in tokens if token not in STOP_WORDS]
+    tokenize = _resolve_tokenizer(tokenizer)
+
+    cleaned = basic_text_clean(text).lower().translate(PUNCT_TABLE)
+    tokens = tokenize(cleaned)
+    stop_words = _stop_words()
+    processed_tokens = [LEMMA_CACHE.lemmatize(token) for token in tokens if token not in stop_words]
     return processed_tokens
 
 
+def preprocess_for_swn_batch(texts: pd.Series, tokenizer: str | None = None,
+                             cleaned: bool = False, token_ids: bool = False) -> pd.Series:
+    """
+    Column-wise preprocess_for_swn, returning a Series of token lists (a TokenArray with token_ids=True).
+    cleaned=True skips basic_text_clean when texts already went through it (e.g. clean_vader).
+    """
+    tokenize = _resolve_tokenizer(tokenizer)
+    stop_words = _stop_words()
+
+    if not cleaned:
+        texts = basic_text_clean_batch(texts)
+    #Python's str.lower rather than the Arrow kernel, which lowercases a few letters
+    #(dotted capital I, final sigma) differently and would change the tokens
+    normalized = [text.lower().translate(PUNCT_TABLE) for text in texts.tolist()]
+    kept = [[token for token in tokenize(text) if token not in stop_words] for text in normalized]
+    #Looking up all of the batch's tokens at once, so cache misses are resolved together
+    lemmas = LEMMA_CACHE.lemmatize_many(token for tokens in kept for token in tokens)
+    tokens = [[lemmas[token] for token in tokens] for tokens in kept]
+    if token_ids:
+        return pd.Series(TokenArray.from_lists(tokens), index=texts.index)
+    return pd.Series(tokens, index=texts.index, dtype=object)
+
+
+def preprocess_for_swn_parallel(texts: pd.Series, n_jobs: int = -1, cleaned: bool = False,
+                                token_ids: bool = False) -> pd.Series:
+    """
+    Runs preprocess_for_swn_batch over a text column on a process pool (-1 uses every core).
+    Each worker loads the NLTK resources once; results keep the input order and index.
+    With token_ids=True workers send back TokenArrays, which pickle as two numpy buffers.
+    """
+    n_jobs = resolve_n_jobs(n_jobs)
+    if n_jobs == 1:
+        return preprocess_for_swn_batch(texts, cleaned=cleaned, token_ids=token_ids)
+    values = texts.tolist()
+    n_chunks = max(1, min(len(values), n_jobs * CHUNKS_PER_JOB))
+    bounds = np.linspace(0, len(values), n_chunks + 1).astype(int)
+    chunks = [values[start:end] for start, end in zip(bounds, bounds[1:])]
+
+    results = []
+    totals = dict.fromkeys(LEMMA_CACHE.stats(), 0)
+    with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_swn_worker) as pool:
+        worker = functools.partial(_swn_chunk, cleaned=cleaned, token_ids=token_ids)
+        for chunk, stats in pool.map(worker, chunks):
+            results.append(chunk)
+            for key, value in stats.items():
+                totals[key] += value
+    LEMMA_CACHE.report(totals)
+
+    if token_ids:
+        return pd.Series(TokenArray.concat(results), index=texts.index)
+    return pd.Series([tokens for chunk in results for tokens in chunk], index=texts.index, dtype=object)
+
+
+def _init_swn_worker() -> None:
+    """
+    Worker initializer: forcing NLTK's lazily loaded tokenizer and WordNet data into memory once.
+    """
+    preprocess_for_swn("Warming up the tokenizers and lemmatizer.")
+
+
+def _swn_chunk(texts: list, cleaned: bool = False,
+               token_ids: bool = False) -> tuple[list[list[str]] | TokenArray, dict]:
+    """
+    Worker: normalizing one chunk of texts. Also returns this chunk's lemma cache counts.
+    """
+    before = LEMMA_CACHE.stats()
+    tokens = preprocess_for_swn_batch(pd.Series(texts, dtype="str"), cleaned=cleaned, token_ids=token_ids)
+    tokens = tokens.array if token_ids else tokens.tolist()
+    LEMMA_CACHE.flush()
+    after = LEMMA_CACHE.stats()
+    return tokens, {key: after[key] - before[key] for key in after}
+
+
 #================================================================
 #Preprocessing Function
 #================================================================
-def preprocess_data(df: pd.DataFrame) -> pd.DataFrame:
+#Defining selected columns
+SELECTED_COLUMNS = [
+    "combined_text", #Merged text - primary model input
+    "sentiment",     #Labeled sentiment - target variable
+    "overall",       #Raw star rating for reference
+    "verified",      #Trust indicator - verified = more genuine sentiment
+    "vote",          #Community signal - higher voted = stronger signal
+    "style_Size",    #Fit/size prevalent in negative reviews
+    "style_Color",   #Sentiment can vary by product variant
+]
+
+#Input columns preprocess_data reads, and the modules whose source it depends on:
+#together with the parameters they key the preprocessed-data cache
+PREPROCESS_INPUT_COLUMNS = ["summary", "reviewText", "reviewerID", *SELECTED_COLUMNS[2:]]
+PREPROCESS_SOURCES = [
+    os.path.join(os.path.dirname(__file__), module)
+    for module in ("basic_preprocess.py", "dedup.py", "token_table.py", "lazy_frame.py", "sketch.py")
+]
+
+
+def label_sentiment(overall: pd.Series) -> pd.Series:
     """
-    Applies sentiment labeling, selects columns, and flags outliers.
+    Maps star ratings to sentiment labels: 4-5 Positive, 3 Neutral, anything else Negative.
     """
+    ratings = overall.to_numpy(dtype="float64", na_value=np.nan)
+    labels = np.select(
+        [ratings >= 4, ratings == 3],
+        ["Positive", "Neutral"],
+        default="Negative",
+    )
+    return pd.Series(labels, index=overall.index, dtype="str")
 
-    print(f"\n{SEPARATOR}")
-    print("Starting preprocessing...")
-    print(SEPARATOR)
 
-    df = df.copy()
-    reviewer_ids = df["reviewerID"].copy() if "reviewerID" in df.columns else None
+def _combined_text(df: pd.DataFrame) -> pd.Series:
+    """
+    Combining summary and reviewText into single column.
+    """
+    return (df["summary"].fillna("") + " " + df["reviewText"].fillna("")).str.strip()
 
-    #Sentiment Labeling
-    def label_sentiment(rating):
-        if rating >= 4:
-            return "Positive"
-        elif rating == 3:
-            return "Neutral"
-        else:
-            return "Negative"
-        
-    df["sentiment"] = df["overall"].apply(label_sentiment)
 
+def word_count_sketch(df: pd.DataFrame, sketch: KLLSketch | None = None) -> KLLSketch:
+    """
+    First pass of chunked outlier flagging: adds the word counts of a chunk's non-empty
+    reviews (the rows preprocess_data flags) to sketch. Sketches from parallel workers merge.
+    """
+    sketch = KLLSketch() if sketch is None else sketch
+    combined_text = _combined_text(df)
+    combined_text = combined_text[combined_text.str.len().to_numpy() > 0]
+    return sketch.update(_word_count(combined_text))
+
+
+def iqr_bounds(sketch: KLLSketch) -> tuple[float, float]:
+    """
+    1.5 * IQR outlier bounds (lower, upper) from a word count sketch.
+    """
+    Q1, Q3 = sketch.quantiles([0.25, 0.75])
+    IQR = Q3 - Q1
+    return Q1 - 1.5 * IQR, Q3 + 1.5 * IQR
+
+
+def _label_and_filter(df: pd.DataFrame, seen: SeenHashes | None = None,
+                      outlier_bounds: tuple[float, float] | None = None) -> pd.DataFrame:
+    """
+    Vectorized core of preprocess_data: labels, selected columns, lengths,
+    empty-review drop, IQR outlier flags and deduplication (on key hashes when seen is given).
+    """
     #Selecting relevant columns
     #Combining summary and reviewText into single column
-    df["combined_text"] = (
-        df["summary"].fillna("") + " " + df["reviewText"].fillna("")
-    ).str.strip()
-
-    #Defining selected columns
-    SELECTED_COLUMNS = [
-        "combined_text", #Merged text - primary model input
-        "sentiment",     #Labeled sentiment - target variable
-        "overall",       #Raw star rating for reference
-        "verified",      #Trust indicator - verified = more genuine sentiment
-        "vote",          #Community signal - higher voted = stronger signal
-        "style_Size",    #Fit/size prevalent in negative reviews
-        "style_Color",   #Sentiment can vary by product variant
-    ]
+    combined_text = _combined_text(df)
 
-    existing_columns = [col for col in SELECTED_COLUMNS if col in df.columns]
-    df = df[existing_columns].copy()
-    if reviewer_ids is not None:
-        df["reviewerID"] = reviewer_ids
+    #Building the working frame directly from the columns it keeps (no full-frame copy)
+    columns = {"combined_text": combined_text, "sentiment": label_sentiment(df["overall"])}
+    for col in SELECTED_COLUMNS[2:]:
+        if col in df.columns:
+            columns[col] = df[col]
+    if "reviewerID" in df.columns:
+        columns["reviewerID"] = df["reviewerID"]
+    out = pd.DataFrame(columns, index=df.index)
 
     #Flagging outliers
     #Calculating lengths of new combined text
-    df["textLen"] = df["combined_text"].str.len()
-    df["wordCount"] = df["combined_text"].str.split().str.len()
+    out["textLen"] = combined_text.str.len()
+    out["wordCount"] = _word_count(combined_text)
 
     #Dropping empty reviews
-    before = len(df)
-    df = df[df["textLen"] > 0].reset_index(drop=True)
-    dropped = before - len(df)
+    before = len(out)
+    out = out[out["textLen"].to_numpy() > 0].reset_index(drop=True)
+    dropped = before - len(out)
 
     if dropped > 0:
         print(f"Dropped {dropped} empty reviews")
 
     #Identifying outliers using IQR method on word count
-    wc = df["wordCount"]
-    Q1 = wc.quantile(0.25)
-    Q3 = wc.quantile(0.75)
-    IQR = Q3 - Q1
-    df["is_outlier"] = (wc < (Q1 - 1.5 * IQR)) | (wc > (Q3 + 1.5 * IQR))
+    #(bounds from a word count sketch when the frame is one chunk of a larger corpus)
+    wc = out["wordCount"]
+    if outlier_bounds is None:
+        Q1, Q3 = wc.quantile([0.25, 0.75])
+        IQR = Q3 - Q1
+        lower, upper = Q1 - 1.5 * IQR, Q3 + 1.5 * IQR
+    else:
+        lower, upper = outlier_bounds
+    out["is_outlier"] = (wc < lower) | (wc > upper)
 
     print("\nApplying lexicon-specific preprocessing...")
-    before_dedup = len(df)
-    if "reviewerID" in df.columns:
-        df = df.drop_duplicates(subset=["reviewerID", "combined_text"]).reset_index(drop=True)
-        df = df.drop(columns=["reviewerID"])
+    before_dedup = len(out)
+    subset = ["reviewerID", "combined_text"] if "reviewerID" in out.columns else ["combined_text"]
+    if seen is not None:
+        keep = seen.add_new(dedup_key_hashes(out, subset, seen.bits))
     else:
-        df = df.drop_duplicates(subset=["combined_text"]).reset_index(drop=True)
-    dropped_dupes = before_dedup - len(df)
+        keep = ~out.duplicated(subset=subset).to_numpy()
+    out = out.loc[keep].drop(columns=["reviewerID"], errors="ignore").reset_index(drop=True)
+    dropped_dupes = before_dedup - len(out)
     if dropped_dupes > 0:
         print(f"Dropped {dropped_dupes} duplicate reviews")
 
-    df["clean_vader"] = df["combined_text"].apply(preprocess_for_vader)
-    df["clean_swn"] = df["combined_text"].apply(preprocess_for_swn)
+    return out
+
+
+def _word_count(text: pd.Series) -> pd.Series:
+    """
+    Counts whitespace-separated words exactly as str.split() does.
+    The token lists are dropped straight away instead of being stored as a Series of lists.
+    """
+    counts = np.fromiter((len(t.split()) for t in text.tolist()), dtype=np.int64, count=len(text))
+    return pd.Series(counts, index=text.index)
+
+
+def _near_duplicate_stage(df: pd.DataFrame, near_dups: str) -> pd.DataFrame:
+    """
+    Flags ("flag") or drops ("collapse") reviews that are near duplicates of an earlier review.
+    """
+    clusters = find_near_duplicates(df["combined_text"])
+    report_near_duplicates(near_duplicate_stats(clusters))
+    is_near_dup = clusters != np.arange(len(df))
+
+    if near_dups == "collapse":
+        out = df.loc[~is_near_dup].reset_index(drop=True)
+        print(f"Dropped {is_near_dup.sum()} near-duplicate reviews")
+        return out
+    df["near_dup_cluster"] = clusters
+    df["is_near_dup"] = is_near_dup
+    return df
+
+
+def preprocess_data(df: pd.DataFrame, n_jobs: int | None = None, token_ids: bool = False,
+                    near_dups: str | None = None, seen: SeenHashes | None = None,
+                    outlier_bounds: tuple[float, float] | None = None,
+                    features=None, cache: bool = False) -> pd.DataFrame:
+    """
+    Applies sentiment labeling, selects columns, and flags outliers.
+    With n_jobs > 1 (or -1 for every core) SWN normalization runs on a process pool.
+    With token_ids=True clean_swn is a TokenArray column (int32 ids + offsets) instead of lists.
+    near_dups="flag" or "collapse" adds the MinHash/LSH near-duplicate stage.
+    seen (a dedup.SeenHashes shared by every chunk) deduplicates on key hashes across chunks.
+    outlier_bounds (lower, upper), e.g. iqr_bounds of a word_count_sketch, replaces the frame's own IQR.
+    features (a subset of TEXT_FEATURES, or one name) builds only those text columns; the others stay lazy
+    on the returned LazyFrame and are built the first time they are read.
+    With cache=True the result is read from / written to the preprocessed-data cache
+    (preprocess_cache.py), keyed by the input columns, these parameters, the code version and the NLTK data.
+    Runs sharing a seen set are never cached, their output depends on earlier chunks.
+    """
+    if near_dups not in (None, "flag", "collapse"):
+        raise ValueError(f"Unknown near_dups {near_dups!r}, expected None, 'flag' or 'collapse'")
+    features = _check_features(features)
+    resolve_n_jobs(n_jobs)
+    if cache and seen is None:
+        params = {"stage": "preprocess_data", "token_ids": token_ids, "near_dups": near_dups,
+                  "outlier_bounds": outlier_bounds, "features": features}
+        return _through_cache(
+            df, params, lambda: preprocess_data(df, n_jobs, token_ids, near_dups, None, outlier_bounds, features),
+            n_jobs, token_ids, features,
+        )
+
+    print(f"\n{SEPARATOR}")
+    print("Starting preprocessing...")
+    print(SEPARATOR)
+
+    df = _label_and_filter(df, seen, outlier_bounds)
+    if near_dups is not None:
+        df = _near_duplicate_stage(df, near_dups)
+    df = _normalize_text(df, n_jobs, token_ids, features)
 
     print(f"\nPreprocessing complete. {len(df)} rows remaining.")
     print(SEPARATOR)
 
     return df
 
+
+def _clean_vader(df: pd.DataFrame) -> pd.Series:
+    """
+    VADER text: the basic clean, which is also the first step of SWN normalization.
+    """
+    return basic_text_clean_batch(df["combined_text"])
+
+
+def _clean_swn(df: pd.DataFrame, n_jobs: int | None = None, token_ids: bool = False) -> pd.Series:
+    """
+    SWN tokens, built on top of clean_vader when the frame already has it.
+    """
+    cleaned = "clean_vader" in df.columns
+    texts = df["clean_vader"] if cleaned else df["combined_text"]
+    if resolve_n_jobs(n_jobs) > 1:
+        return preprocess_for_swn_parallel(texts, n_jobs, cleaned=cleaned, token_ids=token_ids)
+
+    before = LEMMA_CACHE.stats()
+    tokens = preprocess_for_swn_batch(texts, cleaned=cleaned, token_ids=token_ids)
+    LEMMA_CACHE.flush()
+    after = LEMMA_CACHE.stats()
+    LEMMA_CACHE.report({key: after[key] - before[key] for key in after})
+    return tokens
+
+
+def _text_builders(n_jobs: int | None, token_ids: bool) -> dict:
+    """
+    Column name -> builder(frame) for every TEXT_FEATURES column.
+    """
+    return {
+        "clean_vader": _clean_vader,
+        "clean_swn": functools.partial(_clean_swn, n_jobs=n_jobs, token_ids=token_ids),
+    }
+
+
+def _through_cache(df: pd.DataFrame, params: dict, build, n_jobs: int | None,
+                   token_ids: bool, features=None) -> pd.DataFrame:
+    """
+    Serving a preprocessing result from the preprocessed-data cache, or calling build() and storing
+    what it returns. Text columns left lazy are not cached; a hit gets them back as lazy columns.
+    """
+    resources = ("stopwords", "wordnet", "punkt") if SWN_TOKENIZER == "nltk" else ("stopwords", "wordnet")
+    params = {**params, "nltk": metadata.version("nltk"), "swn_tokenizer": SWN_TOKENIZER,
+              "nltk_data": fingerprint(*resources)}
+    key = cache_key(df, PREPROCESS_INPUT_COLUMNS, params, code_version(PREPROCESS_SOURCES))
+    out = read_frame(key)
+    if out is None:
+        out = build()
+        write_frame(out, key)
+        return out
+
+    print(f"\nLoaded preprocessed data from cache ({key[:12]}): {len(out)} rows")
+    if features is not None:
+        out = LazyFrame.from_frame(out, _text_builders(n_jobs, token_ids))
+    return out
+
+
+def _check_features(features) -> list | None:
+    """
+    features as a list of TEXT_FEATURES names: a single name is wrapped, anything else
+    that is not a list, tuple or set of names is rejected.
+    """
+    if features is None:
+        return None
+    if isinstance(features, str):
+        features = [features]
+    elif not isinstance(features, (list, tuple, set, frozenset)):
+        raise TypeError(f"features must be a column name or a list of them, got {type(features).__name__}")
+    unknown = set(features) - set(TEXT_FEATURES)
+    if unknown:
+        raise ValueError(f"Unknown features {sorted(unknown)}, expected any of {list(TEXT_FEATURES)}")
+    return [name for name in TEXT_FEATURES if name in features]
+
+
+def _normalize_text(df: pd.DataFrame, n_jobs: int | None, token_ids: bool,
+                    features=None) -> pd.DataFrame:
+    """
+    Adding the lexicon text columns (the expensive part of preprocess_data): every TEXT_FEATURES
+    column by default, otherwise the requested ones, with the rest left lazy on a LazyFrame.
+    """
+    builders = _text_builders(n_jobs, token_ids)
+    features = _check_features(features)
+    if features is not None:
+        df = LazyFrame.from_frame(df, {name: builders[name] for name in TEXT_FEATURES if name not in features})
+
+    for name in TEXT_FEATURES:
+        if features is None or name in features:
+            df[name] = builders[name](df)
+    return df
+
+
+def preprocess_sample(df: pd.DataFrame, n: int = 1000, random_seed: int = 1,
+                      stratify: str | None = None, quotas: dict | None = None,
+                      n_jobs: int | None = None, token_ids: bool = False,
+                      near_dups: str | None = None, features=None, cache: bool = False) -> pd.DataFrame:
+    """
+    Sample-first plan for lexicon evaluations: same rows and columns as
+    sample_data(preprocess_data(df), ...), but clean_vader / clean_swn are built for the sample only.
+    Labels, outlier bounds, deduplication and near duplicates are still computed over the whole
+    frame, so only the cheap vectorized stages scale with the corpus. features and cache work as in preprocess_data.
+    """
+    if near_dups not in (None, "flag", "collapse"):
+        raise ValueError(f"Unknown near_dups {near_dups!r}, expected None, 'flag' or 'collapse'")
+    features = _check_features(features)
+    resolve_n_jobs(n_jobs)
+    if cache:
+        params = {"stage": "preprocess_sample", "n": n, "random_seed": random_seed, "stratify": stratify,
+                  "quotas": quotas, "token_ids": token_ids, "near_dups": near_dups, "features": features}
+        return _through_cache(
+            df, params,
+            lambda: preprocess_sample(df, n, random_seed, stratify, quotas, n_jobs, token_ids, near_dups, features),
+            n_jobs, token_ids, features,
+        )
+
+    print(f"\n{SEPARATOR}")
+    print("Starting preprocessing (sample first)...")
+    print(SEPARATOR)
+
+    labeled = _label_and_filter(df, None, None)
+    if near_dups is not None:
+        labeled = _near_duplicate_stage(labeled, near_dups)
+    sampled = sample_data(labeled, n=n, random_seed=random_seed, stratify=stratify, quotas=quotas)
+    sampled = _normalize_text(sampled, n_jobs, token_ids, features)
+
+    print(f"\nPreprocessing complete. {len(sampled)} of {len(labeled)} rows normalized.")
+    print(SEPARATOR)
+
+    return sampled
+
 #================================================================
 #Reporting & Visualization (for standalone use)
 #================================================================
@@ -264,6 +888,13 @@ def generate_figures(df: pd.DataFrame) -> None:
     Generates and saves all preprocessing visualizations.
     """
 
+    #Plotting libraries are only needed here, so importing this module does not load them
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    plt.style.use(PLOT_STYLE)
+    os.makedirs(FIGURES_FOLDER, exist_ok=True)
+
     print(f"\n{SEPARATOR}")
     print("Generating figures...")
     print(SEPARATOR)
@@ -349,23 +980,138 @@ def generate_figures(df: pd.DataFrame) -> None:
 #================================================================
 #Sampling
 #================================================================
-def sample_data(df: pd.DataFrame, n: int = 1000, random_seed: int = 1) -> pd.DataFrame:
+def _allocate(sizes: pd.Series, n: int) -> pd.Series:
     """
-    Randomly selects a subset of reviews (default 1000) from dataset
+    Splitting n across strata in proportion to their sizes (largest remainder, so quotas sum to n).
     """
-    n_samples = min(n, len(df))
+    exact = sizes * min(n, sizes.sum()) / sizes.sum()
+    quotas = np.floor(exact).astype(int)
+    remainder = (exact - quotas).sort_values(ascending=False, kind="stable")
+    quotas[remainder.index[:int(min(n, sizes.sum()) - quotas.sum())]] += 1
+    return quotas
 
-    if n_samples < n:
-        print(f"NOTE: Dataset has only {n_samples} rows. Returning all rows.")
-    else:
-        print(f"Sampling {n_samples} random reviews.")
-    
-    sampled_df = df.sample(n=n_samples, random_state=1).reset_index(drop=True)
 
+def _stratum_quotas(sizes: pd.Series, n: int, quotas: dict | None) -> pd.Series:
+    """
+    Rows to draw per stratum: the given quotas (capped at each stratum's size) or a proportional split of n.
+    """
+    if quotas is None:
+        return _allocate(sizes, n)
+    unknown = [stratum for stratum in quotas if stratum not in sizes.index]
+    if unknown:
+        raise ValueError(f"Quotas for unknown strata {unknown}, expected any of {sizes.index.tolist()}")
+    wanted = pd.Series(quotas, dtype="int64").reindex(sizes.index, fill_value=0)
+    short = wanted > sizes
+    for stratum in wanted.index[short]:
+        print(f"NOTE: Stratum {stratum!r} has only {sizes[stratum]} rows. Taking all of them.")
+    return wanted.clip(upper=sizes)
+
+
+def _check_stratify(df: pd.DataFrame, stratify: str | None) -> None:
+    if stratify is not None and stratify not in df.columns:
+        raise ValueError(f"Cannot stratify by {stratify!r}: column not found")
+
+
+def sample_data(df: pd.DataFrame, n: int = 1000, random_seed: int = 1,
+                stratify: str | None = None, quotas: dict | None = None) -> pd.DataFrame:
+    """
+    Randomly selects a subset of reviews (default 1000) from dataset.
+    stratify (e.g. "sentiment" or "overall") samples each stratum separately: quotas maps
+    stratum -> rows, otherwise n is split in proportion to stratum sizes. Rows keep dataset order.
+    """
+    if stratify is None:
+        n_samples = min(n, len(df))
+
+        if n_samples < n:
+            print(f"NOTE: Dataset has only {n_samples} rows. Returning all rows.")
+        else:
+            print(f"Sampling {n_samples} random reviews.")
+
+        sampled_df = df.sample(n=n_samples, random_state=random_seed).reset_index(drop=True)
+        print(f"Sampled DF shape: {sampled_df.shape}")
+        return sampled_df
+
+    _check_stratify(df, stratify)
+    if df.empty:
+        print("NOTE: Dataset is empty. Returning no rows.")
+        return df.reset_index(drop=True)
+    sizes = df[stratify].value_counts(sort=False).sort_index()
+    wanted = _stratum_quotas(sizes, n, quotas)
+    print(f"Sampling {wanted.sum()} random reviews stratified by {stratify}: {wanted.to_dict()}")
+
+    #One generator across strata (in sorted order), so a seed always gives the same sample
+    rng = np.random.default_rng(random_seed)
+    positions = np.arange(len(df))
+    codes = df[stratify].to_numpy()
+    picked = [
+        rng.choice(positions[codes == stratum], size=count, replace=False)
+        for stratum, count in wanted.items()
+    ]
+    sampled_df = df.iloc[np.sort(np.concatenate(picked))].reset_index(drop=True)
     print(f"Sampled DF shape: {sampled_df.shape}")
+    return sampled_df
 
+
+def reservoir_sample(chunks: Iterable[pd.DataFrame], n: int = 1000, random_seed: int = 1,
+                     stratify: str | None = None, quotas: dict | None = None) -> pd.DataFrame:
+    """
+    One-pass uniform sample of n rows from a stream of DataFrame chunks (e.g. load_data_iter),
+    holding at most n rows per stratum between chunks. Every row gets a random key and the
+    smallest keys are kept, so the sample depends only on the seed, not on the chunk size.
+    stratify and quotas work as in sample_data; proportional quotas use the stratum sizes
+    counted over the whole stream.
+    """
+    rng = np.random.default_rng(random_seed)
+    reservoir = None
+    sizes = pd.Series(dtype="int64")
+    limit = n if stratify is None or quotas is None else max(quotas.values(), default=0)
+    total = 0
+
+    for chunk in chunks:
+        _check_stratify(chunk, stratify)
+        keys = rng.random(len(chunk))
+        rows = np.arange(total, total + len(chunk))
+        total += len(chunk)
+        if stratify is not None:
+            sizes = sizes.add(chunk[stratify].value_counts(sort=False), fill_value=0).astype("int64")
+
+        #Rows keyed above the largest kept key (of their stratum) can never enter the sample
+        keep = np.ones(len(chunk), dtype=bool)
+        if reservoir is not None and stratify is None and len(reservoir) == limit:
+            keep = keys < reservoir["_key"].max()
+        elif reservoir is not None and stratify is not None:
+            kept = reservoir.groupby(stratify)["_key"].agg(["max", "size"])
+            bounds = kept["max"].where(kept["size"] >= limit, np.inf)
+            keep = keys < chunk[stratify].map(bounds).fillna(np.inf).to_numpy(dtype=np.float64)
+
+        #Indexing rows by stream position, so the sample can be put back in stream order
+        candidates = chunk[keep].set_axis(pd.Index(rows[keep])).assign(_key=keys[keep])
+        pool = candidates if reservoir is None else pd.concat([reservoir, candidates])
+        #Keeping the limit smallest keys overall, or per stratum
+        if stratify is None:
+            reservoir = pool.nsmallest(limit, "_key")
+        else:
+            reservoir = pool.sort_values("_key", kind="stable").groupby(stratify, sort=False).head(limit)
+
+    if reservoir is None:
+        raise ValueError("Cannot sample from an empty chunk stream")
+
+    if stratify is None:
+        if len(reservoir) < n:
+            print(f"NOTE: Stream has only {len(reservoir)} rows. Returning all rows.")
+        sampled_df = reservoir
+    else:
+        sizes = sizes.sort_index()
+        wanted = _stratum_quotas(sizes, n, quotas)
+        print(f"Sampled {wanted.sum()} reviews stratified by {stratify}: {wanted.to_dict()}")
+        ranks = reservoir.sort_values("_key", kind="stable").groupby(stratify, sort=False).cumcount()
+        sampled_df = reservoir[ranks < reservoir[stratify].map(wanted)]
+
+    #Returning rows in stream order, like sample_data
+    sampled_df = sampled_df.sort_index(kind="stable").drop(columns="_key").reset_index(drop=True)
+    print(f"Sampled DF shape: {sampled_df.shape}")
     return sampled_df
-    
+
 
 #================================================================
 #Entry for standalone execution
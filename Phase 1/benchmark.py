@@ -0,0 +1,775 @@
+"""
+Micro-benchmarks for the loading and preprocessing hot paths.
+Each benchmark times the current implementation against the previous one
+on synthetic data built from the fashion reviews.
+
+Usage:
+    cd "COMP262_PROJECT_GRP1/Phase 1"
+    python benchmark.py                  # run every benchmark
+    python benchmark.py style --rows 2000000
+"""
+
+#Importing libraries
+import argparse
+import os
+import pickle
+import re
+import string
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+#Importing loader and preprocessing functions
+import loader
+from loader import DATA_PATH, BACKENDS, load_data, load_data_iter, load_rows, load_sample, _unpack_style
+from basic_preprocess import _label_and_filter, LemmaCache
+from basic_preprocess import basic_text_clean, tokenize_fast
+from basic_preprocess import basic_text_clean_batch, preprocess_for_swn_batch
+from token_table import TokenArray
+from dedup import find_near_duplicates, near_duplicate_stats, SeenHashes, dedup_key_hashes
+from basic_preprocess import word_count_sketch, iqr_bounds, _combined_text, _word_count
+from sketch import KLLSketch, KLL_RANK_ERROR
+from basic_preprocess import sample_data, reservoir_sample, preprocess_data, preprocess_sample
+from basic_preprocess import PREPROCESS_INPUT_COLUMNS, PREPROCESS_SOURCES
+from preprocess_cache import cache_key, code_version, read_frame, write_frame
+
+SEPARATOR = "-" * 64
+
+#Directory of this file: the subprocess benchmarks import the modules from here
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+#================================================================
+#Helpers
+#================================================================
+def _timeit(func, *args, repeat: int = 3) -> float:
+    """Returning the best wall time of func(*args) over repeat runs.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _report(name: str, rows: int, old: float, new: float) -> None:
+    """Printing one before/after line.
+    """
+    print(f"  {name:<28}: {rows:>10,} rows  "
+          f"old {old:7.3f}s  new {new:7.3f}s  speedup {old / new:5.1f}x")
+
+
+def _scale(df: pd.DataFrame | pd.Series, rows: int, unique_ids: bool = False,
+           copies_per_id: int = 1) -> pd.DataFrame | pd.Series:
+    """Repeating a DataFrame (or Series) up to rows rows with a fresh RangeIndex.
+    unique_ids suffixes reviewerID with the copy number (shared by copies_per_id copies in a row),
+    so deduplication keeps a realistic share of rows.
+    """
+    reps = -(-rows // len(df))
+    big = pd.concat([df] * reps, ignore_index=True).iloc[:rows]
+    if unique_ids:
+        big["reviewerID"] = big["reviewerID"] + "_" + pd.Series(np.arange(rows) // len(df) // copies_per_id).astype(str)
+    return big
+
+
+#================================================================
+#Style unpacking
+#================================================================
+def _unpack_style_legacy(style: pd.Series) -> pd.DataFrame:
+    """Previous _clean style unpacking: per-row apply + json_normalize.
+    """
+    style_df = style.apply(
+        lambda x: {k.strip().rstrip(":"): v.strip()
+                   for k, v in x.items()}
+        if isinstance(x, dict) else {}
+    )
+    expanded_style = pd.json_normalize(style_df)
+    expanded_style.index = style.index
+    expanded_style.columns = [f"style_{col}" for col in expanded_style.columns]
+    return expanded_style
+
+
+def bench_style(df: pd.DataFrame, rows: int) -> None:
+    """Timing style unpacking in _clean.
+    """
+    style = _scale(df["style"], rows)
+    pd.testing.assert_frame_equal(_unpack_style_legacy(style), _unpack_style(style))
+    _report("style unpacking", rows,
+            _timeit(_unpack_style_legacy, style), _timeit(_unpack_style, style))
+
+
+#================================================================
+#JSON parsing backends
+#================================================================
+def bench_backends(df: pd.DataFrame, rows: int) -> None:
+    """Checking every parsing backend gives the stdlib frame, for a full load and for a filtered,
+    projected load keeping style, image and reviewDate, then timing each against stdlib. rows is unused.
+    """
+    columns = ["overall", "style", "image", "reviewDate", "vote"]
+    where = [("vote", ">=", 2), ("reviewDate", ">=", "2015-01-01")]
+    full = {backend: load_data(DATA_PATH, False, backend) for backend in BACKENDS}
+    filtered = {backend: load_data(DATA_PATH, False, backend, columns, where) for backend in BACKENDS}
+    assert filtered["stdlib"]["image"].notna().any() and filtered["stdlib"]["style"].notna().any()
+    for backend in BACKENDS:
+        pd.testing.assert_frame_equal(full[backend], full["stdlib"])
+        pd.testing.assert_frame_equal(filtered[backend], filtered["stdlib"])
+
+    #Filters on derived columns keep the rows the cleaned columns they name would
+    stdlib = full["stdlib"]
+    expected = stdlib[(stdlib["wordCount"] > 10) & stdlib["style_Color"].isin(["Black", "Blue"])]
+    for backend in BACKENDS:
+        derived = load_data(DATA_PATH, False, backend, where=[("wordCount", ">", 10), ("style_Color", "in", ["Black", "Blue"])])
+        assert derived["reviewerID"].tolist() == expected["reviewerID"].tolist()
+
+    base = _timeit(load_data, DATA_PATH, False, "stdlib")
+    for backend in BACKENDS[1:]:
+        _report(f"parse ({backend})", len(df), base, _timeit(load_data, DATA_PATH, False, backend))
+
+
+#================================================================
+#Chunked streaming
+#================================================================
+def bench_stream(df: pd.DataFrame, rows: int) -> None:
+    """Timing load_data_iter in 20 chunks against load_data (no cache), checking every chunk
+    has the same columns and dtypes and that the chunks hold load_data's rows. rows is unused.
+    """
+    chunksize = -(-len(df) // 20)
+    chunks = list(load_data_iter(DATA_PATH, chunksize=chunksize))
+    assert len({(tuple(chunk.columns), tuple(chunk.dtypes)) for chunk in chunks}) == 1
+    streamed = pd.concat(chunks)
+    pd.testing.assert_frame_equal(streamed[df.columns], df, check_dtype=False)
+    _report("streaming (20 chunks)", len(df),
+            _timeit(load_data, DATA_PATH, False),
+            _timeit(lambda: list(load_data_iter(DATA_PATH, chunksize=chunksize))))
+
+
+#================================================================
+#Parallel loading
+#================================================================
+def bench_parallel(df: pd.DataFrame, rows: int) -> None:
+    """Checking load_data over byte shards in a process pool against a serial load, for a
+    full load and a filtered, projected one, then timing both. rows is unused.
+    """
+    columns = ["overall", "style", "reviewDate", "vote"]
+    where = [("overall", "<=", 3)]
+    serial = load_data(DATA_PATH, False)
+    pd.testing.assert_frame_equal(load_data(DATA_PATH, False, n_jobs=2), serial)
+    pd.testing.assert_frame_equal(load_data(DATA_PATH, False, columns=columns, where=where, n_jobs=2),
+                                  load_data(DATA_PATH, False, columns=columns, where=where))
+    _report("parallel load (n_jobs=2)", len(df),
+            _timeit(load_data, DATA_PATH, False), _timeit(lambda: load_data(DATA_PATH, False, n_jobs=2)))
+
+
+#================================================================
+#Compressed input
+#================================================================
+def bench_compressed(df: pd.DataFrame, rows: int) -> None:
+    """Checking .gz, .bz2, .xz and .zst (when zstandard is installed) copies of the data against
+    the plain file: serial, parallel, Arrow backend, streamed and through the cache, with the plain
+    file's cache in the same directory. Then timing each serial load. rows is unused.
+    """
+    import bz2
+    import gzip
+    import lzma
+    compressors = {".gz": gzip.compress, ".bz2": bz2.compress, ".xz": lzma.compress}
+    if loader.zstandard is not None:
+        compressors[".zst"] = loader.zstandard.ZstdCompressor().compress
+
+    with open(DATA_PATH, "rb") as f:
+        data = f.read()
+    plain = load_data(DATA_PATH, False)
+    with tempfile.TemporaryDirectory() as data_dir:
+        path = os.path.join(data_dir, "reviews.json")
+        with open(path, "wb") as f:
+            f.write(data)
+        load_data(path)
+        for ext, compress in compressors.items():
+            with open(path + ext, "wb") as f:
+                f.write(compress(data))
+            pd.testing.assert_frame_equal(load_data(path + ext, False), plain)
+            pd.testing.assert_frame_equal(load_data(path + ext, False, n_jobs=2), plain)
+            pd.testing.assert_frame_equal(load_data(path + ext, False, "arrow"), plain)
+            streamed = pd.concat(load_data_iter(path + ext, chunksize=1000))
+            pd.testing.assert_frame_equal(streamed[plain.columns], plain, check_dtype=False)
+            load_data(path + ext)
+            pd.testing.assert_frame_equal(load_data(path + ext), plain)
+        #Caches of the plain and compressed copies live side by side
+        pd.testing.assert_frame_equal(load_data(path), plain)
+        assert len(os.listdir(os.path.join(data_dir, ".cache"))) == len(compressors) + 1
+
+        base = _timeit(load_data, path, False)
+        for ext in compressors:
+            _report(f"parse ({ext})", len(df), base, _timeit(load_data, path + ext, False))
+
+
+#================================================================
+#Row lookups through the offset index
+#================================================================
+def bench_rows(df: pd.DataFrame, rows: int) -> None:
+    """Checking load_rows and load_sample against the same rows of load_data, and that an
+    empty sample keeps the columns, then timing a 1,000-row sample against a full parse. rows is unused.
+    """
+    picked = [len(df) - 1, 0, len(df) // 2]
+    fetched = load_rows(picked)
+    pd.testing.assert_frame_equal(fetched, df.loc[picked, fetched.columns])
+    assert list(fetched.columns) == [col for col in df.columns if col in fetched.columns]
+
+    sample = load_sample(1000, random_seed=1)
+    assert sample.index.is_monotonic_increasing and sample.index.is_unique
+    pd.testing.assert_frame_equal(sample, df.loc[sample.index, sample.columns])
+    pd.testing.assert_frame_equal(load_sample(1000, random_seed=1), sample)
+
+    empty = load_sample(0)
+    assert empty.empty and {"overall", "reviewText", "reviewDate", "wordCount"} <= set(empty.columns)
+    _report("1,000-row sample (offset index)", len(df),
+            _timeit(load_data, DATA_PATH, False), _timeit(load_sample, 1000))
+
+
+#================================================================
+#Cache watermark
+#================================================================
+def bench_watermark(df: pd.DataFrame, rows: int) -> None:
+    """Checking the cleaned-data cache against a fresh parse after an in-place edit that keeps
+    the file size, after an append ending in a half-written line and after lines appended
+    while the cache was being built. rows is unused.
+    """
+    with open(DATA_PATH, "rb") as f:
+        lines = f.read().splitlines(keepends=True)
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        path = os.path.join(data_dir, "reviews.json")
+
+        def write(data: bytes, mode: str = "wb") -> None:
+            with open(path, mode) as f:
+                f.write(data)
+            #Moving the mtime on explicitly, a fast rewrite can land in the same clock tick
+            stat = os.stat(path)
+            os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+        def check() -> pd.DataFrame:
+            cached = load_data(path)
+            pd.testing.assert_frame_equal(cached, load_data(path, cache=False))
+            return cached
+
+        write(b"".join(lines[:-2]))
+        load_data(path)
+
+        #Same size, one rating changed in the middle of the file, outside the hashed head and tail
+        row = next(i for i in range(len(lines) // 2, len(lines)) if b'"overall": 5.0' in lines[i])
+        edited = lines[:row] + [lines[row].replace(b'"overall": 5.0', b'"overall": 4.0', 1)] + lines[row + 1:-2]
+        write(b"".join(edited))
+        assert check()["overall"].iloc[row] == 4.0
+
+        #One full line plus the start of another: only the full line is ingested
+        write(lines[-2] + lines[-1][:20], "ab")
+        assert len(load_data(path)) == len(lines) - 1
+        write(lines[-1][20:], "ab")
+        assert len(check()) == len(lines)
+
+        #Lines appended during the first parse are left to the next load, not read twice
+        parse = loader._parse
+        def appending_parse(*args, **kwargs):
+            write(b"".join(lines[-5:]), "ab")
+            return parse(*args, **kwargs)
+        write(b"".join(lines[:-5]))
+        loader._parse = appending_parse
+        try:
+            assert len(load_data(path)) == len(lines) - 5
+        finally:
+            loader._parse = parse
+        assert len(check()) == len(lines)
+    print(f"  cache watermark: same-size edit rebuilt, half-written line held back, "
+          f"lines appended mid-load read once ({len(lines):,} rows)")
+
+
+#================================================================
+#Labeling and filtering core of preprocess_data
+#================================================================
+def _label_and_filter_legacy(df: pd.DataFrame) -> pd.DataFrame:
+    """Previous preprocess_data core: apply-based labels, list-based word counts, extra copies.
+    """
+    df = df.copy()
+    reviewer_ids = df["reviewerID"].copy() if "reviewerID" in df.columns else None
+
+    def label_sentiment(rating):
+        if rating >= 4:
+            return "Positive"
+        elif rating == 3:
+            return "Neutral"
+        else:
+            return "Negative"
+
+    df["sentiment"] = df["overall"].apply(label_sentiment)
+    df["combined_text"] = (
+        df["summary"].fillna("") + " " + df["reviewText"].fillna("")
+    ).str.strip()
+
+    selected = ["combined_text", "sentiment", "overall", "verified", "vote", "style_Size", "style_Color"]
+    df = df[[col for col in selected if col in df.columns]].copy()
+    if reviewer_ids is not None:
+        df["reviewerID"] = reviewer_ids
+
+    df["textLen"] = df["combined_text"].str.len()
+    df["wordCount"] = df["combined_text"].str.split().str.len()
+    df = df[df["textLen"] > 0].reset_index(drop=True)
+
+    wc = df["wordCount"]
+    Q1 = wc.quantile(0.25)
+    Q3 = wc.quantile(0.75)
+    IQR = Q3 - Q1
+    df["is_outlier"] = (wc < (Q1 - 1.5 * IQR)) | (wc > (Q3 + 1.5 * IQR))
+
+    if "reviewerID" in df.columns:
+        df = df.drop_duplicates(subset=["reviewerID", "combined_text"]).reset_index(drop=True)
+        df = df.drop(columns=["reviewerID"])
+    else:
+        df = df.drop_duplicates(subset=["combined_text"]).reset_index(drop=True)
+    return df
+
+
+def bench_preprocess(df: pd.DataFrame, rows: int) -> None:
+    """Timing the labeling / filtering stage of preprocess_data (no lexicon normalization).
+    """
+    big = _scale(df, rows, unique_ids=True)
+
+    pd.testing.assert_frame_equal(_label_and_filter_legacy(big), _label_and_filter(big))
+    _report("preprocess label/filter", rows,
+            _timeit(_label_and_filter_legacy, big), _timeit(_label_and_filter, big))
+
+
+#================================================================
+#Lemma memoization
+#================================================================
+def bench_lemma(df: pd.DataFrame, rows: int) -> None:
+    """Timing token lemmatization with and without the lemma cache, in tokens/sec.
+    The row count is scaled down by 100 since uncached lemmatization is slow.
+    """
+    #Loads WordNet, so only imported by the benchmarks that lemmatize
+    from basic_preprocess import LEMMATIZER
+    text = _scale(df["reviewText"].fillna("").str.lower(), max(rows // 100, 1))
+    tokens = [token for review in text for token in review.split()]
+
+    def uncached():
+        for token in tokens:
+            LEMMATIZER.lemmatize(token)
+
+    def cached(cache):
+        for token in tokens:
+            cache.lemmatize(token)
+
+    def batched(cache):
+        lemmas = cache.lemmatize_many(tokens)
+        return [lemmas[token] for token in tokens]
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cold = LemmaCache(cache_dir=cache_dir)
+        cold_time = _timeit(cached, cold, repeat=1)
+        cold.flush()
+        warm = LemmaCache(cache_dir=cache_dir)
+        warm_time = _timeit(cached, warm, repeat=1)
+        memory_time = _timeit(cached, warm, repeat=1)
+        stats = warm.stats()
+        warm._db.close()
+        batch = LemmaCache(cache_dir=cache_dir)
+        batch_time = _timeit(batched, batch, repeat=1)
+        assert batched(batch) == [cold.lemmatize(token) for token in tokens]
+        assert batch.stats()["wordnet_calls"] == 0, batch.stats()
+        batch._db.close()
+        cold._db.close()
+    base_time = _timeit(uncached, repeat=1)
+
+    n = len(tokens)
+    print(f"  lemmatization ({n:,} tokens, {len(set(tokens)):,} distinct)")
+    for name, elapsed in [("WordNet only", base_time), ("cache, cold", cold_time),
+                          ("cache, warm disk", warm_time), ("batch, warm disk", batch_time),
+                          ("cache, warm memory", memory_time)]:
+        print(f"    {name:<20}: {n / elapsed:>12,.0f} tokens/sec")
+    print(f"    WordNet calls on the warm run: {stats['wordnet_calls']:,}")
+
+
+#================================================================
+#SWN tokenizer parity
+#================================================================
+def bench_tokenizer(df: pd.DataFrame, rows: int) -> None:
+    """Parity harness for the fast SWN tokenizer: counting reviews whose tokens differ
+    from nltk.word_tokenize on the whole corpus, then timing both.
+    """
+    import nltk
+    texts = _combined_text(df)
+    table = str.maketrans("", "", string.punctuation)
+    cleaned = [basic_text_clean(text).lower().translate(table) for text in texts]
+
+    differ = [text for text in cleaned if tokenize_fast(text) != nltk.word_tokenize(text)]
+    print(f"  tokenizer parity: {len(differ):,} of {len(cleaned):,} reviews differ "
+          f"({len(differ) / len(cleaned):.3%})")
+    for text in differ[:5]:
+        print(f"    fast: {tokenize_fast(text)[:12]}")
+        print(f"    nltk: {nltk.word_tokenize(text)[:12]}")
+
+    big = _scale(pd.Series(cleaned), rows // 10).tolist()
+    _report("SWN tokenization", len(big),
+            _timeit(lambda: [nltk.word_tokenize(text) for text in big], repeat=1),
+            _timeit(lambda: [tokenize_fast(text) for text in big], repeat=1))
+
+
+#================================================================
+#Column-wise text cleaning
+#================================================================
+def _clean_columns_legacy(texts: pd.Series) -> tuple[pd.Series, pd.Series]:
+    """Previous clean_vader / clean_swn: per-row apply, re.sub and a fresh maketrans per review.
+    """
+    from basic_preprocess import STOP_WORDS, LEMMA_CACHE
+    def clean(text):
+        if pd.isna(text):
+            return ""
+        text = re.sub(r"http\S+|www\.\S+", " ", str(text))
+        return re.sub(r"\s+", " ", text).strip()
+
+    def swn(text):
+        cleaned = clean(text).lower().translate(str.maketrans("", "", string.punctuation))
+        return [LEMMA_CACHE.lemmatize(token) for token in tokenize_fast(cleaned) if token not in STOP_WORDS]
+
+    return texts.apply(clean), texts.apply(swn)
+
+
+def _clean_columns(texts: pd.Series) -> tuple[pd.Series, pd.Series]:
+    """Current clean_vader / clean_swn: batch cleaning, SWN built on top of the VADER column.
+    """
+    vader = basic_text_clean_batch(texts)
+    return vader, preprocess_for_swn_batch(vader, cleaned=True)
+
+
+def bench_clean(df: pd.DataFrame, rows: int) -> None:
+    """Timing clean_vader + clean_swn construction (lemma cache warm for both).
+    The row count is scaled down by 10 since SWN normalization is slow.
+    """
+    texts = _scale(_combined_text(df), max(rows // 10, 1))
+    for old, new in zip(_clean_columns_legacy(texts), _clean_columns(texts)):
+        pd.testing.assert_series_equal(old, new)
+    _report("clean_vader + clean_swn", len(texts),
+            _timeit(_clean_columns_legacy, texts), _timeit(_clean_columns, texts))
+
+
+#================================================================
+#Token id storage for clean_swn
+#================================================================
+def _loaded_size(payload: bytes) -> int:
+    """Returning the bytes Python allocates to unpickle payload.
+    """
+    tracemalloc.start()
+    obj = pickle.loads(payload)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del obj
+    return size
+
+
+def bench_tokens(df: pd.DataFrame, rows: int) -> None:
+    """Comparing clean_swn as lists of strings with a TokenArray: memory, pickle size and time.
+    The row count is scaled down by 10 since SWN normalization is slow.
+    """
+    texts = _combined_text(df)
+    #Copying each row so tiled rows are distinct lists, as they are after normalization
+    lists = [list(row) for row in _scale(preprocess_for_swn_batch(texts), max(rows // 10, 1))]
+    tokens = TokenArray.from_lists(lists)
+    assert tokens.to_lists() == lists
+
+    #Behaving like the list column in comparisons, assignment, factorizing, exploding and Arrow
+    import pyarrow as pa
+    listed, typed = pd.Series(lists, dtype=object), pd.Series(tokens)
+    assert (tokens == TokenArray.from_lists(lists)).all() and not (tokens != lists).any()
+    assert typed.duplicated().tolist() == listed.map(tuple).duplicated().tolist()
+    assert typed.explode().tolist() == listed.explode().tolist()
+    assert pa.array(tokens).to_pylist() == lists
+    edited = tokens.copy()
+    edited[[0, len(edited) - 1]] = [["first"], []]
+    assert edited.to_lists() == [["first"]] + lists[1:-1] + [[]]
+
+    print(f"  clean_swn storage ({len(lists):,} rows, {len(tokens.ids):,} tokens, "
+          f"{len(tokens.vocab):,} distinct)")
+    for name, obj in [("list[str] per row", lists), ("TokenArray", tokens)]:
+        payload = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+        dump = _timeit(pickle.dumps, obj, pickle.HIGHEST_PROTOCOL)
+        load = _timeit(pickle.loads, payload)
+        print(f"    {name:<18}: memory {_loaded_size(payload) / 2**20:8.1f} MiB  "
+              f"pickle {len(payload) / 2**20:8.1f} MiB  dump {dump:6.3f}s  load {load:6.3f}s")
+
+
+#================================================================
+#Near-duplicate detection scaling
+#================================================================
+def bench_near_dups(df: pd.DataFrame, rows: int) -> None:
+    """Timing MinHash/LSH near-duplicate detection at three corpus sizes to show linear scaling.
+    Each tiled copy gets a unique suffix so copies are near rather than exact duplicates.
+    """
+    texts = _combined_text(df)
+    print("  near-duplicate detection (MinHash/LSH)")
+    for n in (max(rows // 4, 1), max(rows // 2, 1), rows):
+        tiled = _scale(texts, n) + " copy" + pd.Series(np.arange(n) // len(texts)).astype(str)
+        start = time.perf_counter()
+        stats = near_duplicate_stats(find_near_duplicates(tiled))
+        elapsed = time.perf_counter() - start
+        print(f"    {n:>10,} rows: {elapsed:7.2f}s  ({elapsed / n * 1e6:5.1f} us/row)  "
+              f"{stats['clusters']:,} clusters, {stats['near_duplicates']:,} near duplicates")
+
+
+#================================================================
+#Hashed deduplication across chunks
+#================================================================
+def bench_dedup(df: pd.DataFrame, rows: int) -> None:
+    """Checking hashed, chunked deduplication against drop_duplicates, timing both, and
+    testing the collision rate: 2**22 distinct keys truncated to 32 bits must collide
+    about as often as a random function would (n**2 / 2**33 pairs).
+    """
+    #One reviewer per copy for every tenth copy, so later chunks repeat keys from earlier ones
+    big = _scale(df, rows, unique_ids=True, copies_per_id=10)
+    subset = ["reviewerID", "reviewText"]
+    chunksize = max(rows // 20, 1)
+
+    def chunked():
+        seen = SeenHashes()
+        parts = [big.iloc[start:start + chunksize] for start in range(0, rows, chunksize)]
+        return pd.concat([part.loc[seen.add_new(dedup_key_hashes(part, subset))] for part in parts]), seen
+
+    exact = big.drop_duplicates(subset=subset)
+    hashed, seen = chunked()
+    pd.testing.assert_frame_equal(exact, hashed)
+    _report("dedup (20 chunks, hashed)", rows,
+            _timeit(big.drop_duplicates, subset), _timeit(chunked))
+    print(f"    seen-set: {len(seen):,} keys in {seen.nbytes / 2**20:.1f} MiB")
+
+    n = 1 << 22
+    keys = pd.DataFrame({"key": pd.Series(np.arange(n)).astype(str) + " review"})
+    hashes = dedup_key_hashes(keys, ["key"])
+    assert len(np.unique(hashes)) == n, "64-bit collision among 4M distinct keys"
+    truncated = np.sort(hashes >> np.uint64(32))
+    _, counts = np.unique(truncated, return_counts=True)
+    observed = int((counts * (counts - 1) // 2).sum())
+    expected = n * (n - 1) / 2 / 2**32
+    assert abs(observed - expected) < 6 * expected ** 0.5, (observed, expected)
+    print(f"    collisions of {n:,} keys at 32 bits: {observed:,} (random function: {expected:,.0f})"
+          f" -> at 64 bits ~{n * n / 2**65:.1e} expected")
+
+
+def _max_rank_error(sketch: KLLSketch, values: np.ndarray, qs: np.ndarray) -> float:
+    """Largest distance, as a fraction of n, between q * n and the true rank range of the sketch's q-quantile.
+    """
+    ordered = np.sort(values)
+    answers = sketch.quantiles(qs)
+    below = np.searchsorted(ordered, answers, side="left")
+    through = np.searchsorted(ordered, answers, side="right")
+    target = qs * len(ordered)
+    return float(np.maximum(below - target, target - through).clip(min=0).max() / len(ordered))
+
+
+def bench_sketch(df: pd.DataFrame, rows: int) -> None:
+    """Testing the KLL sketch error bound (KLL_RANK_ERROR of n at 99 quantiles) on one sketch,
+    on 20 merged chunk sketches and on the word counts of a chunk stream, then comparing
+    chunked outlier flags from sketch bounds with the exact IQR flags.
+    """
+    qs = np.linspace(0.01, 0.99, 99)
+    values = np.random.default_rng(0).lognormal(3, 1, rows)
+    chunks = np.array_split(values, 20)
+
+    single = KLLSketch().update(values)
+    merged = KLLSketch()
+    for chunk in chunks:
+        merged.merge(KLLSketch().update(chunk))
+    for name, sketch in [("single", single), ("merged", merged)]:
+        error = _max_rank_error(sketch, values, qs)
+        assert error <= KLL_RANK_ERROR, (name, error)
+        print(f"    {name}: max rank error {error:.4f} (bound {KLL_RANK_ERROR}), {sketch.nbytes / 2**10:.1f} KiB")
+    _report("quartiles (sketch vs np.quantile)", rows,
+            _timeit(np.quantile, values, [0.25, 0.75]), _timeit(lambda: KLLSketch().update(values)))
+
+    big = _scale(df, rows)
+    chunksize = max(rows // 20, 1)
+    sketch = KLLSketch()
+    for start in range(0, rows, chunksize):
+        word_count_sketch(big.iloc[start:start + chunksize], sketch)
+    wc = _word_count(_combined_text(big))
+    wc = wc[wc > 0].to_numpy()
+    error = _max_rank_error(sketch, wc, qs)
+    assert error <= KLL_RANK_ERROR, ("word counts", error)
+    lower, upper = iqr_bounds(sketch)
+    rerun = KLLSketch()
+    for start in range(0, rows, chunksize):
+        word_count_sketch(big.iloc[start:start + chunksize], rerun)
+    assert iqr_bounds(rerun) == (lower, upper), "outlier bounds differ between identical runs"
+    Q1, Q3 = np.quantile(wc, [0.25, 0.75])
+    exact = (wc < Q1 - 1.5 * (Q3 - Q1)) | (wc > Q3 + 1.5 * (Q3 - Q1))
+    flagged = (wc < lower) | (wc > upper)
+    print(f"    word counts: max rank error {error:.4f}; bounds ({lower:g}, {upper:g}) vs exact"
+          f" ({Q1 - 1.5 * (Q3 - Q1):g}, {Q3 + 1.5 * (Q3 - Q1):g}); {int((exact != flagged).sum()):,}"
+          f" of {len(wc):,} flags differ")
+
+
+def bench_sampling(df: pd.DataFrame, rows: int) -> None:
+    """Timing a stratified 1,000-row sample of an in-memory frame against a one-pass reservoir
+    sample of the same rows in 20 chunks, and checking the reservoir ignores the chunk size.
+    """
+    big = _scale(df, rows)
+
+    def chunks(count):
+        size = -(-rows // count)
+        return (big.iloc[start:start + size] for start in range(0, rows, size))
+
+    first = reservoir_sample(chunks(20), random_seed=7, stratify="overall")
+    pd.testing.assert_frame_equal(first, reservoir_sample(chunks(7), random_seed=7, stratify="overall"))
+    assert sample_data(big.iloc[:0], 1000, 7, "overall").columns.equals(big.columns)
+    try:
+        sample_data(big, 10, 7, "overall", quotas={6.0: 10})
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("a quota for a missing stratum was accepted")
+    _report("stratified sample (reservoir, 20 chunks)", rows,
+            _timeit(sample_data, big, 1000, 7, "overall"),
+            _timeit(lambda: reservoir_sample(chunks(20), random_seed=7, stratify="overall")))
+    print(f"    per-stratum rows: {first['overall'].value_counts().sort_index().to_dict()}")
+
+
+def bench_sample_first(df: pd.DataFrame, rows: int) -> None:
+    """Timing a 1,000-review lexicon sample: preprocessing everything then sampling, against
+    the sample-first plan that normalizes only the sampled rows (outputs must match).
+    """
+    #Distinct reviewers per copy, so deduplication keeps every copy and the corpus really has rows rows
+    big = _scale(df, rows, unique_ids=True)
+
+    pd.testing.assert_frame_equal(sample_data(preprocess_data(big), n=1000), preprocess_sample(big, n=1000))
+    _report("1,000-review sample (sample first)", rows,
+            _timeit(lambda: sample_data(preprocess_data(big), n=1000), repeat=1),
+            _timeit(lambda: preprocess_sample(big, n=1000), repeat=1))
+
+
+def bench_features(df: pd.DataFrame, rows: int) -> None:
+    """Timing preprocess_data with both text columns against VADER-only and SWN-only runs,
+    whose other column is left lazy (and must match the eager one once read).
+    """
+    big = _scale(df, rows, unique_ids=True)
+
+    eager = preprocess_data(big)
+    vader_only = preprocess_data(big, features=["clean_vader"])
+    pd.testing.assert_series_equal(vader_only["clean_swn"], eager["clean_swn"])
+    assert preprocess_data(big, features="clean_vader").lazy_columns == ("clean_swn",)
+    try:
+        preprocess_data(big, features=42)
+    except TypeError:
+        pass
+    else:
+        raise AssertionError("features=42 was accepted")
+    full = _timeit(preprocess_data, big, repeat=1)
+    _report("preprocess_data (clean_vader only)", rows, full,
+            _timeit(lambda: preprocess_data(big, features=["clean_vader"]), repeat=1))
+    _report("preprocess_data (clean_swn only)", rows, full,
+            _timeit(lambda: preprocess_data(big, features=["clean_swn"]), repeat=1))
+
+
+def bench_preprocess_cache(df: pd.DataFrame, rows: int) -> None:
+    """Timing preprocess_data (token ids) against a hit in the preprocessed-data cache,
+    including hashing the input to find the entry. The cached frame must round-trip exactly,
+    and a hit through preprocess_data(cache=True) must not import NLTK.
+    """
+    big = _scale(df, rows, unique_ids=True)
+    params = {"token_ids": True}
+
+    def cached(cache_dir):
+        return read_frame(cache_key(big, PREPROCESS_INPUT_COLUMNS, params, code_version(PREPROCESS_SOURCES)), cache_dir)
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        built = preprocess_data(big, token_ids=True)
+        write_frame(built, cache_key(big, PREPROCESS_INPUT_COLUMNS, params, code_version(PREPROCESS_SOURCES)), cache_dir)
+        hit = cached(cache_dir)
+        assert isinstance(hit["clean_swn"].array, TokenArray)
+        pd.testing.assert_frame_equal(hit.assign(clean_swn=hit["clean_swn"].astype(object)),
+                                      built.assign(clean_swn=built["clean_swn"].astype(object)))
+        _report("preprocess_data (cache hit)", rows,
+                _timeit(lambda: preprocess_data(big, token_ids=True), repeat=1), _timeit(cached, cache_dir))
+
+    #The full path, key and NLTK data fingerprint included, in a fresh interpreter
+    preprocess_data(df, token_ids=True, cache=True)
+    check = ("import sys, time; from loader import load_data; from basic_preprocess import preprocess_data; "
+             "df = load_data(); start = time.perf_counter(); preprocess_data(df, token_ids=True, cache=True); "
+             "print(f'{time.perf_counter() - start:.3f}'); assert 'nltk' not in sys.modules")
+    result = subprocess.run([sys.executable, "-c", check], capture_output=True, text=True, check=True, cwd=HERE)
+    print(f"  preprocess_data(cache=True) hit in a fresh interpreter: {float(result.stdout.split()[-1]):.3f}s, NLTK not imported")
+
+
+def _import_time(statement: str, repeat: int = 3) -> float:
+    """Returning the best -X importtime total (seconds) of the modules statement imports,
+    in a fresh interpreter each run, not counting what the interpreter imports on startup.
+    """
+    def top_level_total(code):
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                                capture_output=True, text=True, check=True, cwd=HERE)
+        #Top-level entries ("| name", one space) hold the cumulative time of everything under them
+        times = [line.split("|") for line in result.stderr.splitlines() if line.startswith("import time:")]
+        return sum(int(cumulative) for _, cumulative, name in times[1:] if not name.startswith("  ")) / 1e6
+
+    startup = min(top_level_total("pass") for _ in range(repeat))
+    return min(top_level_total(statement) for _ in range(repeat)) - startup
+
+
+def bench_importtime(df: pd.DataFrame, rows: int) -> None:
+    """Cold-start import of basic_preprocess (python -X importtime, fresh interpreter each run)
+    against importing it together with the plotting and NLTK modules it used to load eagerly.
+    rows is unused. Checks that a plain import leaves matplotlib, seaborn and nltk unloaded.
+    """
+    check = ("import sys, basic_preprocess; "
+             "loaded = [m for m in ('matplotlib', 'seaborn', 'nltk') if m in sys.modules]; "
+             "assert not loaded, loaded")
+    subprocess.run([sys.executable, "-c", check], check=True, cwd=HERE)
+
+    old = _import_time("import matplotlib.pyplot, seaborn, nltk, basic_preprocess")
+    new = _import_time("import basic_preprocess")
+    print(f"  {'import basic_preprocess':<34} old {old:7.3f}s  new {new:7.3f}s  speedup {old / new:5.1f}x")
+
+
+#================================================================
+#Entry for standalone execution
+#================================================================
+BENCHMARKS = {
+    "style": bench_style,
+    "backends": bench_backends,
+    "stream": bench_stream,
+    "parallel": bench_parallel,
+    "rows": bench_rows,
+    "compressed": bench_compressed,
+    "watermark": bench_watermark,
+    "preprocess": bench_preprocess,
+    "lemma": bench_lemma,
+    "tokenizer": bench_tokenizer,
+    "clean": bench_clean,
+    "tokens": bench_tokens,
+    "near_dups": bench_near_dups,
+    "dedup": bench_dedup,
+    "sketch": bench_sketch,
+    "sampling": bench_sampling,
+    "sample_first": bench_sample_first,
+    "features": bench_features,
+    "preprocess_cache": bench_preprocess_cache,
+    "importtime": bench_importtime,
+}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("names", nargs="*", metavar="name",
+                        help=f"benchmarks to run, any of {list(BENCHMARKS)} (default: all)")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+    for name in args.names:
+        if name not in BENCHMARKS:
+            parser.error(f"unknown benchmark {name!r}, expected one of {list(BENCHMARKS)}")
+
+    df = load_data(DATA_PATH)
+
+    print(SEPARATOR)
+    print("Benchmarks (best of 3)")
+    print(SEPARATOR)
+    for name in args.names or BENCHMARKS:
+        BENCHMARKS[name](df, args.rows)
@@ -0,0 +1,71 @@
+"""
+DataFrame whose expensive columns are computed on first access.
+Returns LazyFrame
+
+preprocess_data(df, features=[...]) builds only the requested text columns and
+registers the others as lazy: a builder function of the frame, run the first
+time the column is read with df[name] (or df[[..., name]]) and then stored.
+Builders read the frame they are called on, so a lazy column still works after
+filtering, sample() or train_test_split:
+    df = preprocess_data(df, features=["clean_vader"])
+    df.lazy_columns        #('clean_swn',)
+    df["clean_swn"]        #normalized now, for these rows only
+    df.materialize()       #every remaining lazy column
+
+Only indexing with [] triggers a builder; attribute access, .loc and pd.concat
+do not know about lazy columns, so materialize() before those.
+"""
+
+#Importing libraries
+import pandas as pd
+
+
+class LazyFrame(pd.DataFrame):
+    """
+    pandas DataFrame with a mapping of lazy column name -> builder(frame) -> Series.
+    The mapping is carried to frames derived from this one (slices, copies, samples).
+    """
+    _metadata = ["_lazy"]
+    _lazy = {}
+
+    @property
+    def _constructor(self):
+        return LazyFrame
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, lazy: dict) -> "LazyFrame":
+        """
+        Wrapping df with lazy columns (builders for columns df already has are dropped).
+        """
+        out = cls(df)
+        out._lazy = {name: build for name, build in lazy.items() if name not in df.columns}
+        return out
+
+    @property
+    def lazy_columns(self) -> tuple:
+        """
+        Names of the columns not built yet.
+        """
+        return tuple(name for name in self._lazy if name not in self.columns)
+
+    def materialize(self, *names: str) -> "LazyFrame":
+        """
+        Building the given lazy columns (all of them by default) in place.
+        """
+        for name in names or self.lazy_columns:
+            if name not in self.columns:
+                self[name] = self._lazy[name](self)
+        #Rebinding instead of mutating: frames derived from this one share the old mapping
+        self._lazy = {name: build for name, build in self._lazy.items() if name not in self.columns}
+        return self
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            pending = [key] if key in self.lazy_columns else []
+        elif isinstance(key, list):
+            pending = [name for name in key if isinstance(name, str) and name in self.lazy_columns]
+        else:
+            pending = []
+        if pending:
+            self.materialize(*pending)
+        return super().__getitem__(key)
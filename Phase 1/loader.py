@@ -4,6 +4,42 @@ Returns DataFrame
 Usage:
     from loader import load_data
     df = load_data()
+
+The cleaned frame is cached next to the data file (Data/.cache/) in Arrow
+format the first time it is loaded, so later loads skip JSON parsing.
+The cache records a watermark (bytes and rows ingested, source mtime); when the
+file has only grown since, just the new complete lines are parsed and appended.
+A truncated or rewritten file (or one touched without growing) triggers a full
+rebuild. Requires pyarrow; without it loading falls back to parsing every time.
+
+JSON parsing backend (falls back to stdlib when the library is missing):
+    df = load_data(backend="arrow")   # bulk multithreaded Arrow reader
+    df = load_data(backend="orjson")  # per-line orjson
+
+Loading only some fields and rows (applied while parsing):
+    df = load_data(columns=["overall", "reviewText"],
+                   where=[("overall", "<=", 2), ("reviewDate", ">=", "2015-01-01")])
+
+Memory-compact dtypes (categoricals, small ints, nullable booleans):
+    df = load_data(compact=True)
+    memory_report(load_data(), df)
+
+Parallel loading over newline-aligned byte shards (-1 = all cores):
+    df = load_data(n_jobs=8)
+
+Random access and sampling without a full parse (uses a persisted line-offset index):
+    from loader import load_rows, load_sample
+    df = load_rows([0, 10, 99])
+    df = load_sample(n=1000, random_seed=1)
+
+Compressed input (.gz, .bz2, .xz, .zst) is decompressed on the fly by every
+loader except the offset index, which needs a seekable plain file:
+    df = load_data("Data/AMAZON_FASHION.json.gz", n_jobs=-1)
+
+Streaming usage for files too large to hold in memory:
+    from loader import load_data_iter
+    for chunk in load_data_iter(chunksize=100_000):
+        ...
 """
 
 #Importing libraries
@@ -11,39 +47,1023 @@ import json
 import pandas as pd
 import numpy as np
 import os
+import io
+import bz2
+import glob
+import gzip
+import hashlib
+import lzma
+import mmap
+import operator
+import re
+from collections import deque
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator
+
+#Arrow is optional - it is only needed for the on-disk cache and arrow backend
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.feather as feather
+    import pyarrow.json as pa_json
+except ImportError:
+    pa = None
+
+#orjson is optional - faster drop-in for json.loads
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+#zstandard is optional - only needed for .zst input
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 #Defining data path
 DATA_PATH = os.path.join(os.path.dirname(__file__), "Data", "AMAZON_FASHION_5.json")
 
-def load_data(path: str = DATA_PATH) -> pd.DataFrame:
+#Default number of rows per chunk when streaming
+CHUNKSIZE = 100_000
+
+#Version of the _clean logic, part of the cache key
+#Bump this whenever _clean changes so stale caches are rebuilt
+CLEAN_VERSION = 4
+
+#Columns _clean adds (besides style_*)
+DERIVED_COLUMNS = ("reviewDate", "reviewLen", "wordCount", "summaryLen")
+
+#Raw fields of the review data, in output column order, with the dtype each has after _clean.
+#load_data_iter gives every chunk all of them (nullable where a chunk may lack values).
+#"str" is pandas 3's string dtype, which keeps missing values as NaN (requirements pin pandas>=3)
+FIELD_DTYPES = {
+    "overall": "float64",
+    "verified": "boolean",
+    "reviewTime": "datetime64[us]",
+    "reviewerID": "str",
+    "asin": "str",
+    "style": object,
+    "reviewerName": "str",
+    "reviewText": "str",
+    "summary": "str",
+    "unixReviewTime": "Int64",
+    "vote": "float64",
+    "image": object,
+}
+
+#Raw field each derived column is computed from (style_* columns come from style)
+DERIVED_SOURCES = {"reviewDate": "unixReviewTime", "reviewLen": "reviewText",
+                   "wordCount": "reviewText", "summaryLen": "summary"}
+
+#dtypes of the derived and style_* columns in load_data_iter chunks
+DERIVED_DTYPES = {"reviewDate": "datetime64[s]", "reviewLen": "int64", "wordCount": "int64", "summaryLen": "int64"}
+STYLE_DTYPE = "str"
+
+#Style keys seen in the Amazon Fashion data, in output column order
+#Keys not listed here are still unpacked, after these, sorted by name
+STYLE_KEYS = ("Size:", "Color:", "Size Name:", "Style:", "Metal Type:", "Length:", "Format:")
+
+#Repetitive text columns stored as categoricals in compact mode (plus every style_* column)
+CATEGORY_COLUMNS = ("asin", "reviewerID", "reviewerName")
+
+#Integer columns downcast in compact mode
+INT32_COLUMNS = ("reviewLen", "wordCount", "summaryLen")
+
+#Supported JSON parsing backends
+BACKENDS = ("stdlib", "orjson", "arrow")
+
+#Bytes per block for the Arrow JSON reader (each block is parsed on its own thread)
+ARROW_BLOCK_SIZE = 1 << 24
+
+#Bytes read per block while building the line-offset index
+INDEX_BLOCK_SIZE = 1 << 24
+
+#Version of the line-offset index format, part of its cache file name
+INDEX_VERSION = 2
+
+#Bytes bytes.strip() removes: a line of only these is blank and has no row
+WHITESPACE_BYTES = np.frombuffer(b" \t\n\r\x0b\x0c", dtype=np.uint8)
+
+#Key segment of cache file names: v<CLEAN_VERSION> for cleaned data, <size>-<mtime>[.v<N>] for other caches
+CACHE_KEY_PATTERN = r"v\d+|\d+-\d+(\.v\d+)?"
+
+#Bytes hashed at the start of the file and just before the watermark to detect rewrites
+FINGERPRINT_BYTES = 1 << 16
+
+#Extensions decompressed on the fly
+COMPRESSED_EXTENSIONS = (".gz", ".bz2", ".xz", ".zst")
+
+#Decompressed bytes per block handed to each worker when loading compressed input in parallel
+PARALLEL_BLOCK_SIZE = 1 << 25
+
+#Byte shards per worker in parallel loading - more than one evens out uneven shards
+SHARDS_PER_JOB = 4
+
+#Comparison operators allowed in where filters
+WHERE_OPS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<" : operator.lt,
+    "<=": operator.le,
+    ">" : operator.gt,
+    ">=": operator.ge,
+    "in": lambda value, options: value in options,
+    "not in": lambda value, options: value not in options,
+}
+
+def load_data(path: str = DATA_PATH, cache: bool = True, backend: str = "stdlib",
+              columns: list[str] | None = None, where: list[tuple] | None = None,
+              compact: bool = False, n_jobs: int | None = None) -> pd.DataFrame:
     """
     Loading data into a cleaned DataFrame.
+    With cache=True the cleaned frame is read from / written to the Arrow cache.
+    backend selects the JSON parser, one of BACKENDS.
+    columns keeps only the listed raw fields (derived columns follow their source);
+    a derived column (reviewDate, wordCount, style_Size, ...) loads its source field.
+    where is a list of (field, op, value) filters on raw or derived fields, all of which
+    must hold. Values are compared as the cleaned types (vote a number, reviewTime a date);
+    derived fields are computed from each raw record the way _clean computes them.
+    Only full loads (no columns / where) use the cache.
+    compact=True converts the result with compact_dtypes.
+    n_jobs > 1 parses and cleans byte shards in a process pool (-1 uses every core).
+    Compressed files are decompressed in this process and parsed in blocks by the pool.
     """
 
-    print(f"Loading data from: {path}")
+    backend = _resolve_backend(backend)
+    columns = _normalize_columns(columns)
+    where = _normalize_where(where)
 
-    records = []
-    with open(path, "r", encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
-            if line:
-                records.append(json.loads(line))
+    full_load = columns is None and not where
+    cache_path = _cache_path(path) if cache and full_load and pa is not None else None
+    df = None
+    if cache_path is not None and os.path.exists(cache_path):
+        print(f"Loading cached data from: {cache_path}")
+        df = _refresh_cache(path, cache_path, backend)
+
+    if df is None:
+        #Taking the size before parsing and reading no further, so the watermark covers exactly
+        #the bytes parsed and lines appended meanwhile are left for the next load
+        stat = os.stat(path)
+        size = stat.st_size
+        print(f"Loading data from: {path}")
+        n_jobs = resolve_n_jobs(n_jobs)
+        if n_jobs > 1:
+            df = _load_parallel(path, backend, columns, where, n_jobs, size)
+        else:
+            df = _parse(path, backend, columns, where, size=size)
+            print(f"  Loaded {len(df):,} rows x {len(df.columns)} columns")
+
+            #Cleaning data
+            df = _clean(df)
+        print(f"  Cleaning complete. Final shape: {df.shape}\n")
+
+        if cache_path is not None:
+            _write_cache(df, path, cache_path, _watermark(path, size, len(df), stat.st_mtime_ns))
+
+    if compact:
+        df = compact_dtypes(df)
+
+    return df
+
+def compact_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Converting a cleaned frame to memory-compact dtypes.
+    Repetitive text columns become categoricals, ratings / votes / lengths small
+    (nullable) ints and verified a nullable boolean. Values are unchanged.
+    """
+    df = df.copy()
+    before = df.memory_usage(deep=True).sum()
+
+    for col in df.columns:
+        if col in CATEGORY_COLUMNS or col.startswith("style_"):
+            df[col] = df[col].astype("category")
+
+    if "overall" in df.columns:
+        ratings = df["overall"].dropna()
+        integral = (ratings == ratings.round()).all()
+        df["overall"] = df["overall"].astype("Int8" if integral else "float32")
+
+    if "vote" in df.columns:
+        df["vote"] = df["vote"].astype("Int32")
+
+    #A plain bool column is already 1 byte per row, only object columns (with gaps) convert
+    if "verified" in df.columns and df["verified"].dtype == object:
+        df["verified"] = df["verified"].astype("boolean")
+
+    for col in INT32_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype("int32")
+
+    after = df.memory_usage(deep=True).sum()
+    print(f"  Compacted dtypes: {before / 1e6:,.1f} MB -> {after / 1e6:,.1f} MB "
+          f"({before / max(after, 1):.1f}x smaller)\n")
+    return df
+
+def memory_report(before: pd.DataFrame, after: pd.DataFrame | None = None) -> pd.DataFrame:
+    """
+    Printing and returning bytes per column, optionally before and after compaction.
+    """
+    report = pd.DataFrame({
+        "dtype": before.dtypes.astype(str),
+        "bytes": before.memory_usage(deep=True, index=False),
+    })
+    if after is not None:
+        report["compact dtype"] = after.dtypes.astype(str)
+        report["compact bytes"] = after.memory_usage(deep=True, index=False)
+        report["ratio"] = (report["bytes"] / report["compact bytes"]).round(1)
+
+    totals = report.select_dtypes("number").sum()
+    print("Memory usage by column:")
+    print(report.to_string())
+    print(f"  Total: {totals['bytes'] / 1e6:,.1f} MB", end="")
+    if after is not None:
+        print(f" -> {totals['compact bytes'] / 1e6:,.1f} MB "
+              f"({totals['bytes'] / totals['compact bytes']:.1f}x smaller)", end="")
+    print()
+    return report
+
+def _parse(path: str | None, backend: str, columns: list[str] | None = None,
+           where: list[tuple] | None = None, data: bytes | None = None,
+           size: int | None = None) -> pd.DataFrame:
+    """Parsing the JSONL file (or data, an in-memory block of its lines)
+    into a raw (uncleaned) DataFrame. size stops a plain file after its first size bytes.
+    """
+    if data is None and size is not None and not _is_compressed(path):
+        with open(path, "rb") as f:
+            data = f.read(size)
+
+    df = None
+    if backend == "arrow":
+        #Arrow reads plain files itself; blocks and compressed streams go in as file objects
+        if data is not None:
+            source = io.BytesIO(data)
+        else:
+            source = _open(path) if _is_compressed(path) else path
+        try:
+            df = _read_arrow(source, columns, where)
+        except pa.ArrowInvalid as e:
+            print(f"  NOTE: Arrow reader failed ({e}). Falling back to stdlib.")
+        finally:
+            if not isinstance(source, str):
+                source.close()
+
+    if df is None:
+        loads = _json_loads(backend)
+        if data is not None:
+            records = list(_iter_records(data.splitlines(), loads, columns, where))
+        else:
+            with _open(path, "r") as f:
+                records = list(_iter_records(f, loads, columns, where))
+
+        #Creating DataFrame from records list
+        df = pd.DataFrame(records)
+
+    return _order_fields(df, columns)
+
+def _order_fields(df: pd.DataFrame, columns: list[str] | None = None) -> pd.DataFrame:
+    """Putting the requested (or else known) fields of a raw frame first, in that order,
+    so every backend, shard and row lookup gives the same columns.
+    """
+    order = FIELD_DTYPES if columns is None else columns
+    return df[[col for col in order if col in df.columns] + [col for col in df.columns if col not in order]]
+
+def _is_compressed(path: str) -> bool:
+    """Checking whether path has a compressed extension.
+    """
+    return path.lower().endswith(COMPRESSED_EXTENSIONS)
+
+def _open(path: str, mode: str = "rb"):
+    """Opening path for reading, decompressing .gz / .bz2 / .xz / .zst on the fly.
+    mode is "rb" for bytes or "r" for UTF-8 text.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".gz":
+        f = gzip.open(path, "rb")
+    elif ext == ".bz2":
+        f = bz2.open(path, "rb")
+    elif ext == ".xz":
+        f = lzma.open(path, "rb")
+    elif ext == ".zst":
+        if zstandard is None:
+            raise ImportError("Reading .zst files requires the zstandard package")
+        reader = zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+        f = io.BufferedReader(reader)
+    else:
+        f = open(path, "rb")
+
+    if mode == "r":
+        return io.TextIOWrapper(f, encoding="utf-8")
+    return f
+
+#================================================================
+#Parallel loading
+#================================================================
+def resolve_n_jobs(n_jobs: int | None) -> int:
+    """Number of worker processes for n_jobs: None runs in this process (1), -1 uses every core.
+    """
+    if n_jobs is None:
+        return 1
+    if isinstance(n_jobs, bool) or not isinstance(n_jobs, (int, np.integer)) or (n_jobs < 1 and n_jobs != -1):
+        raise ValueError(f"n_jobs must be None, -1 or a positive integer, got {n_jobs!r}")
+    return (os.cpu_count() or 1) if n_jobs == -1 else int(n_jobs)
+
+def _shard_ranges(path: str, n_shards: int, size: int | None = None) -> list[tuple[int, int]]:
+    """Splitting the file (its first size bytes) into about n_shards byte ranges
+    that start and end on line boundaries.
+    """
+    size = os.path.getsize(path) if size is None else size
+    bounds = [0]
+    with open(path, "rb") as f:
+        for i in range(1, n_shards):
+            #Moving each cut forward to just after the next newline
+            f.seek(size * i // n_shards)
+            f.readline()
+            bounds.append(min(max(f.tell(), bounds[-1]), size))
+    bounds.append(size)
+    return [(start, end) for start, end in zip(bounds, bounds[1:]) if end > start]
+
+def _iter_blocks(path: str, block_size: int) -> Iterator[bytes]:
+    """Reading (decompressed) blocks of about block_size bytes that end on a line boundary.
+    """
+    with _open(path) as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            yield block + f.readline()
+
+def _load_block(data: bytes, backend: str, columns: list[str] | None,
+                where: list[tuple] | None) -> tuple[pd.DataFrame, list]:
+    """Worker: parsing and cleaning one block of lines. Also returns the raw column order.
+    """
+    df = _parse(None, backend, columns, where, data)
+    return _clean(df), list(df.columns)
+
+def _load_shard(path: str, byte_range: tuple[int, int], backend: str,
+                columns: list[str] | None, where: list[tuple] | None) -> tuple[pd.DataFrame, list]:
+    """Worker: reading one byte range of a plain file, then parsing and cleaning it.
+    """
+    start, end = byte_range
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    return _load_block(data, backend, columns, where)
+
+def _load_parallel(path: str, backend: str, columns: list[str] | None,
+                   where: list[tuple] | None, n_jobs: int, size: int | None = None) -> pd.DataFrame:
+    """Parsing and cleaning shards in a process pool and concatenating them in file order.
+    Plain files are split into byte ranges each worker reads itself. Compressed
+    files cannot be seeked, so blocks are decompressed here and sent to the pool,
+    with at most two blocks per worker in flight to bound memory.
+    size limits a plain file to its first size bytes.
+    """
+    with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+        if _is_compressed(path):
+            print(f"  Parsing decompressed blocks on {n_jobs} processes")
+            results = []
+            pending = deque()
+            for block in _iter_blocks(path, PARALLEL_BLOCK_SIZE):
+                pending.append(pool.submit(_load_block, block, backend, columns, where))
+                if len(pending) >= 2 * n_jobs:
+                    results.append(pending.popleft().result())
+            results.extend(future.result() for future in pending)
+        else:
+            shards = _shard_ranges(path, n_jobs * SHARDS_PER_JOB, size)
+            print(f"  Parsing {len(shards)} shards on {n_jobs} processes")
+            n = len(shards)
+            results = list(pool.map(_load_shard, [path] * n, shards, [backend] * n,
+                                    [columns] * n, [where] * n))
+    if not results:
+        return _clean(pd.DataFrame())
+
+    #Raw fields in first-seen order across shards, as a single pass would see them
+    raw_columns = list(dict.fromkeys(col for _, shard_columns in results for col in shard_columns))
+
+    df = pd.concat([shard for shard, _ in results], ignore_index=True)
+    print(f"  Loaded {len(df):,} rows x {len(raw_columns)} columns")
+    return df[_column_order(raw_columns, df.columns)]
+
+def _raw_columns(columns) -> list:
+    """Picking the raw JSON fields out of a cleaned frame's columns.
+    """
+    return [col for col in columns if col not in DERIVED_COLUMNS and not col.startswith("style_")]
+
+def _column_order(raw_columns: list, columns) -> list:
+    """Ordering concatenated shard columns the way a single _clean call would:
+    raw fields, then derived columns, then style_* in _unpack_style order.
+    """
+    base = list(_clean(pd.DataFrame(columns=raw_columns)).columns)
+    known = [f"style_{key.strip().rstrip(':')}" for key in STYLE_KEYS]
+    style = [col for col in columns if col not in base]
+    style.sort(key=lambda col: (known.index(col), "") if col in known else (len(known), col))
+    return base + style
+
+def load_data_iter(path: str = DATA_PATH, chunksize: int = CHUNKSIZE, backend: str = "stdlib",
+                   columns: list[str] | None = None,
+                   where: list[tuple] | None = None) -> Iterator[pd.DataFrame]:
+    """
+    Streaming data as cleaned DataFrame chunks of at most chunksize rows.
+    Every chunk has the same columns in the same dtypes: each FIELD_DTYPES field (or each of
+    columns) with its derived columns, and a style_* column per STYLE_KEYS key, missing values
+    where a chunk lacks them. Fields and style keys outside those lists are added when first
+    seen and carried into later chunks. The index continues across chunks, so concatenating
+    every chunk gives the rows and values of load_data, in these fixed dtypes.
+    Parsing is line by line, so backend="arrow" uses orjson (or stdlib) here.
+    columns and where work as in load_data; chunksize counts rows kept.
+    """
+
+    if chunksize < 1:
+        raise ValueError(f"chunksize must be a positive integer, got {chunksize}")
+    backend = _resolve_backend(backend)
+    loads = _json_loads(backend)
+    columns = _normalize_columns(columns)
+    where = _normalize_where(where)
+
+    print(f"Streaming data from: {path} (chunksize={chunksize:,})")
+
+    fields = list(FIELD_DTYPES) if columns is None else list(columns)
+    layout = _chunk_layout(fields)
+    total = 0
+    with _open(path, "r") as f:
+        records = []
+        for record in _iter_records(f, loads, columns, where):
+            records.append(record)
+            if len(records) == chunksize:
+                chunk, layout = _clean_chunk(records, total, layout)
+                total += len(chunk)
+                records = []
+                yield chunk
 
-    #Creating DataFrame from records list
-    df = pd.DataFrame(records)
-    print(f"  Loaded {len(df):,} rows x {len(df.columns)} columns")
+        #Flushing the final partial chunk
+        if records:
+            chunk, layout = _clean_chunk(records, total, layout)
+            total += len(chunk)
+            yield chunk
 
-    #Cleaning data
+    print(f"  Streamed {total:,} rows\n")
+
+#================================================================
+#Parsing
+#================================================================
+def _resolve_backend(backend: str) -> str:
+    """Validating the backend name and falling back to stdlib if its library is missing.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r}, expected one of {BACKENDS}")
+    if backend == "orjson" and orjson is None:
+        print("  NOTE: orjson is not installed. Falling back to stdlib.")
+        return "stdlib"
+    if backend == "arrow" and pa is None:
+        print("  NOTE: pyarrow is not installed. Falling back to stdlib.")
+        return "stdlib"
+    return backend
+
+def _json_loads(backend: str):
+    """Picking the per-line parser for a resolved backend.
+    """
+    if backend in ("orjson", "arrow") and orjson is not None:
+        return orjson.loads
+    return json.loads
+
+def _iter_records(lines, loads=json.loads, columns: list[str] | None = None,
+                  where: list[tuple] | None = None) -> Iterator[dict]:
+    """Parsing non-blank JSONL lines into dicts.
+    Records failing where are skipped and fields outside columns are dropped
+    before they reach the DataFrame.
+    """
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        record = loads(line)
+        if where and not _matches(record, where):
+            continue
+        if columns is not None:
+            record = {k: record[k] for k in columns if k in record}
+        yield record
+
+def _read_arrow(path: str, columns: list[str] | None = None,
+                where: list[tuple] | None = None) -> pd.DataFrame:
+    """Parsing the whole file in bulk with Arrow's multithreaded JSON reader.
+    Filtering and projection run on the Arrow table, before any Python objects exist.
+    Nested values are converted back to what json.loads would give:
+    structs to dicts without the keys a record did not have, lists to lists.
+    """
+    table = pa_json.read_json(
+        path, read_options=pa_json.ReadOptions(block_size=ARROW_BLOCK_SIZE)
+    )
+    if where:
+        table = table.filter(_arrow_mask(table, where))
+        #Dropping fields no kept record has, which the record-by-record parsers never see
+        table = table.select([
+            name for name, column in zip(table.column_names, table.columns) if column.null_count < len(column)
+        ])
+    if columns is not None:
+        table = table.select([col for col in columns if col in table.column_names])
+    df = table.to_pandas()
+
+    for field in table.schema:
+        if pa.types.is_struct(field.type):
+            df[field.name] = df[field.name].map(
+                lambda x: {k: v for k, v in x.items() if v is not None},
+                na_action="ignore",
+            )
+        elif pa.types.is_list(field.type) or pa.types.is_large_list(field.type):
+            df[field.name] = df[field.name].map(list, na_action="ignore")
+        else:
+            continue
+        df[field.name] = df[field.name].where(df[field.name].notna(), np.nan)
+
+    return df
+
+def _chunk_dtype(col: str):
+    """The fixed load_data_iter dtype of a column (None keeps whatever _clean gives it).
+    Resolved to a dtype object, so comparing it with a column's dtype does not parse a name.
+    """
+    dtype = STYLE_DTYPE if col.startswith("style_") else {**FIELD_DTYPES, **DERIVED_DTYPES}.get(col)
+    return None if dtype is None else pd.api.types.pandas_dtype(dtype)
+
+def _chunk_layout(fields: list) -> tuple[list, dict]:
+    """Columns every load_data_iter chunk starts with, and the dtype of each: the fields,
+    their derived columns and, when style is among them, a style_* column per STYLE_KEYS key.
+    Worked out once per stream; _clean_chunk only extends it when new columns turn up.
+    """
+    style = [f"style_{key.strip().rstrip(':')}" for key in STYLE_KEYS] if "style" in fields else []
+    columns = _column_order(fields, list(_clean(pd.DataFrame(columns=fields)).columns) + style)
+    return columns, {col: _chunk_dtype(col) for col in columns}
+
+def _clean_chunk(records: list, start: int, layout: tuple[list, dict]) -> tuple[pd.DataFrame, tuple[list, dict]]:
+    """Cleaning one chunk of records and aligning it to the running layout (columns and dtypes).
+    """
+    columns, dtypes = layout
+    df = pd.DataFrame(records, index=pd.RangeIndex(start, start + len(records)))
+    #Fields no record in the chunk has still go through _clean, so their derived columns exist
+    missing = [col for col in _raw_columns(columns) if col not in df.columns]
+    if missing:
+        df[missing] = np.nan
     df = _clean(df)
-    print(f"  Cleaning complete. Final shape: {df.shape}\n")
 
+    #Appending newly seen columns, keeping first-seen order
+    new = [col for col in df.columns if col not in dtypes]
+    if new:
+        columns = columns + new
+        dtypes = {**dtypes, **{col: _chunk_dtype(col) for col in new}}
+
+    #Converting only the columns not already in their chunk dtype; absent ones are made in it
+    out = {}
+    for col in columns:
+        dtype = dtypes[col]
+        if col not in df.columns:
+            out[col] = pd.Series(np.nan, index=df.index, dtype=dtype)
+        elif dtype is None or df[col].dtype == dtype:
+            out[col] = df[col]
+        else:
+            out[col] = df[col].astype(dtype)
+    return pd.DataFrame(out, copy=False), (columns, dtypes)
+
+#================================================================
+#Row filters
+#================================================================
+def _normalize_columns(columns: list[str] | None) -> list[str] | None:
+    """Mapping requested columns to the raw fields to read: derived columns to their source.
+    """
+    if columns is None:
+        return None
+    fields = []
+    for col in columns:
+        field = "style" if col.startswith("style_") else DERIVED_SOURCES.get(col, col)
+        if field not in fields:
+            fields.append(field)
+    return fields
+
+def _where_value(field: str, value):
+    """Checking a where value against the cleaned type of a raw or derived field.
+    Dates become Timestamps; unknown fields and values that cannot be compared raise ValueError.
+    """
+    dtype = STYLE_DTYPE if field.startswith("style_") else {**FIELD_DTYPES, **DERIVED_DTYPES}.get(field)
+    if dtype is None:
+        raise ValueError(f"Unknown where field {field!r}, expected one of "
+                         f"{list(FIELD_DTYPES) + list(DERIVED_DTYPES)} or a style_* column")
+    if dtype is object:
+        raise ValueError(f"Cannot filter on nested field {field!r}")
+    if str(dtype).startswith("datetime"):
+        try:
+            return pd.Timestamp(value)
+        except (TypeError, ValueError) as error:
+            raise ValueError(f"where value {value!r} for {field!r} must be a date") from error
+    expected = {"float64": "a number", "Int64": "a number", "int64": "a number",
+                "boolean": "a bool", "str": "a string"}[dtype]
+    if expected == "a number":
+        valid = isinstance(value, (int, float, np.number)) and not isinstance(value, (bool, np.bool_))
+    else:
+        valid = isinstance(value, (bool, np.bool_) if expected == "a bool" else str)
+    if not valid:
+        raise ValueError(f"where value {value!r} for {field!r} must be {expected}")
+    return value
+
+def _normalize_where(where: list[tuple] | None) -> list[tuple]:
+    """Validating where filters and translating reviewDate bounds to unixReviewTime.
+    """
+    normalized = []
+    for field, op, value in where or []:
+        if op not in WHERE_OPS:
+            raise ValueError(f"Unknown where operator {op!r}, expected one of {list(WHERE_OPS)}")
+        if field == "reviewDate":
+            #reviewDate is derived in _clean, so filtering happens on the raw timestamp
+            field = "unixReviewTime"
+            if op in ("in", "not in"):
+                value = [int(pd.Timestamp(v).timestamp()) for v in value]
+            else:
+                value = int(pd.Timestamp(value).timestamp())
+        elif op in ("in", "not in"):
+            value = [_where_value(field, v) for v in value]
+        else:
+            value = _where_value(field, value)
+        normalized.append((field, op, value))
+    return normalized
+
+def _raw_vote(raw) -> float | None:
+    """A raw vote ("1,234") as _clean converts it, None when it is not a number.
+    """
+    try:
+        return float(str(raw).replace(",", ""))
+    except ValueError:
+        return None
+
+def _raw_review_time(raw) -> datetime | None:
+    """A raw reviewTime ("09 4, 2015") as _clean converts it, None when it is not a date.
+    """
+    try:
+        return datetime.strptime(raw, "%m %d, %Y")
+    except (TypeError, ValueError):
+        return None
+
+def _raw_style(style, name: str) -> str | None:
+    """A record's style_* value as _unpack_style gives it, None when the record has none.
+    """
+    if not isinstance(style, dict):
+        return None
+    keys = [k for k in STYLE_KEYS if k in style] + sorted(set(style).difference(STYLE_KEYS))
+    for key in keys:
+        if f"style_{key.strip().rstrip(':')}" == name and isinstance(style[key], str):
+            return style[key].strip()
+    return None
+
+#Raw text fields converted before comparing, the way _clean converts them
+RAW_CASTS = {"vote": _raw_vote, "reviewTime": _raw_review_time}
+
+#Derived columns (besides reviewDate) computed from their source value, the way _clean computes them
+DERIVED_VALUES = {
+    "reviewLen": lambda text: len(text or ""),
+    "wordCount": lambda text: len((text or "").split()),
+    "summaryLen": lambda text: len(text or ""),
+}
+
+def _field_value(record: dict, field: str):
+    """The value a where filter on field compares for a raw record (None when missing).
+    """
+    if field.startswith("style_"):
+        return _raw_style(record.get("style"), field)
+    if field in DERIVED_VALUES:
+        return DERIVED_VALUES[field](record.get(DERIVED_SOURCES[field]))
+    raw = record.get(field)
+    if raw is not None and field in RAW_CASTS:
+        raw = RAW_CASTS[field](raw)
+    return raw
+
+def _matches(record: dict, where: list[tuple]) -> bool:
+    """Checking a raw record against every filter. Missing fields never match.
+    """
+    for field, op, value in where:
+        raw = _field_value(record, field)
+        if raw is None:
+            return False
+        if not WHERE_OPS[op](raw, value):
+            return False
+    return True
+
+def _arrow_mask(table, where: list[tuple]):
+    """Building the boolean row mask for where filters on an Arrow table.
+    """
+    compare = {
+        "==": pc.equal, "!=": pc.not_equal,
+        "<" : pc.less,  "<=": pc.less_equal,
+        ">" : pc.greater, ">=": pc.greater_equal,
+    }
+
+    mask = None
+    for field, op, value in where:
+        derived = field.startswith("style_") or field in DERIVED_VALUES
+        source = "style" if field.startswith("style_") else DERIVED_SOURCES.get(field, field)
+        if source not in table.column_names and not derived:
+            return pa.array(np.zeros(table.num_rows, dtype=bool))
+        column = table[source] if source in table.column_names else pa.nulls(table.num_rows)
+        #Derived fields computed from their source in Python, exactly as the per-line parsers do
+        if derived:
+            values = column.to_pylist()
+            if field.startswith("style_"):
+                values = [None if d is None else {k: v for k, v in d.items() if v is not None} for d in values]
+                column = pa.array([_raw_style(d, field) for d in values], type=pa.string())
+            else:
+                column = pa.array([DERIVED_VALUES[field](text) for text in values], type=pa.int64())
+        #Raw text fields converted like RAW_CASTS; values that do not convert become null
+        elif field == "vote" and not pa.types.is_floating(column.type):
+            numbers = pd.to_numeric(column.to_pandas().astype(str).str.replace(",", ""), errors="coerce")
+            column = pa.array(numbers, type=pa.float64(), from_pandas=True)
+        elif field == "reviewTime":
+            column = pc.strptime(column, format="%m %d, %Y", unit="s", error_is_null=True)
+            if op in ("in", "not in"):
+                value = [v.to_pydatetime() for v in value]
+            else:
+                value = pa.scalar(value.to_pydatetime(), column.type)
+        if op in ("in", "not in"):
+            cond = pc.is_in(column, value_set=pa.array(list(value), type=column.type))
+            if op == "not in":
+                cond = pc.invert(cond)
+        else:
+            cond = compare[op](column, value)
+        #Nulls never match, same as missing fields in _matches
+        cond = pc.fill_null(cond, False)
+        mask = cond if mask is None else pc.and_(mask, cond)
+    return mask
+
+#================================================================
+#Line-offset index
+#================================================================
+def build_offset_index(path: str = DATA_PATH) -> np.ndarray:
+    """
+    Returning the start byte offset of every non-blank line (one with anything but whitespace) as a uint64 array,
+    so row i of load_data starts at index[i]. The index is stored in Data/.cache/
+    as .npy and rebuilt only when the source file changes.
+    """
+    if _is_compressed(path):
+        raise ValueError(f"The offset index needs an uncompressed file, got {path}")
+
+    index_path = _cache_path(path, f"v{INDEX_VERSION}.offsets.npy", versioned=False)
+    if os.path.exists(index_path):
+        return np.load(index_path, mmap_mode="r")
+
+    ends = []
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        pos = 0
+        while True:
+            block = f.read(INDEX_BLOCK_SIZE)
+            if not block:
+                break
+            newlines = np.flatnonzero(np.frombuffer(block, dtype=np.uint8) == ord("\n"))
+            ends.append(newlines.astype(np.uint64) + np.uint64(pos))
+            pos += len(block)
+
+    ends = np.concatenate(ends) if ends else np.empty(0, dtype=np.uint64)
+    if len(ends) == 0 or ends[-1] != size - 1:
+        #Last line without a trailing newline
+        ends = np.append(ends, np.uint64(size))
+    starts = np.concatenate([np.zeros(1, dtype=np.uint64), ends[:-1] + np.uint64(1)])
+
+    #Skipping blank lines, which load_data skips too. Records start with "{", so only the
+    #rare lines starting with whitespace need their whole content checked
+    lengths = ends.astype(np.int64) - starts.astype(np.int64)
+    blank = lengths == 0
+    if size:
+        data = np.memmap(path, dtype=np.uint8, mode="r")
+        padded = np.flatnonzero(~blank)[np.isin(data[starts[~blank]], WHITESPACE_BYTES)]
+        for i in padded:
+            blank[i] = not bytes(data[starts[i]:ends[i]]).strip()
+        del data
+    index = np.ascontiguousarray(starts[~blank], dtype=np.uint64)
+
+    def write(tmp_path):
+        with open(tmp_path, "wb") as f:
+            np.save(f, index)
+
+    _write_cache_file(path, index_path, "offsets.npy", write)
+    return index
+
+def load_rows(rows, path: str = DATA_PATH) -> pd.DataFrame:
+    """
+    Fetching rows by position (as numbered by load_data) through the offset index.
+    Only the requested lines are read and parsed; the result keeps their row numbers as index.
+    """
+    index = build_offset_index(path)
+    rows = np.asarray(rows, dtype=np.int64)
+    if len(rows) and (rows.min() < 0 or rows.max() >= len(index)):
+        raise IndexError(f"Row numbers must be in [0, {len(index)})")
+
+    records = []
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for row in rows:
+            start = int(index[row])
+            end = mm.find(b"\n", start)
+            records.append(json.loads(mm[start:end if end != -1 else len(mm)]))
+
+    if not records:
+        #No rows to infer columns from: every field and its derived columns, in their chunk dtypes
+        columns, dtypes = _chunk_layout(list(FIELD_DTYPES))
+        return pd.DataFrame({col: pd.Series(dtype=dtypes[col]) for col in columns if not col.startswith("style_")},
+                            index=pd.Index(rows))
+    df = pd.DataFrame(records, index=pd.Index(rows))
+    return _clean(_order_fields(df))
+
+def load_sample(n: int = 1000, random_seed: int = 1, path: str = DATA_PATH) -> pd.DataFrame:
+    """
+    Drawing a uniform random sample of n rows without parsing the rest of the file.
+    Rows come back in file order; the same seed always gives the same sample.
+    """
+    index = build_offset_index(path)
+    n = min(n, len(index))
+    rng = np.random.default_rng(random_seed)
+    rows = np.sort(rng.choice(len(index), size=n, replace=False))
+    return load_rows(rows, path)
+
+#================================================================
+#On-disk cache
+#================================================================
+def _cache_path(path: str, suffix: str = "arrow", versioned: bool = True) -> str:
+    """Building a cache file path for a source file.
+    Cleaned data is keyed by CLEAN_VERSION and tracks the source through its watermark;
+    other caches are keyed by the source size and mtime.
+    """
+    cache_dir = os.path.join(os.path.dirname(os.path.abspath(path)), ".cache")
+    if versioned:
+        key = f"v{CLEAN_VERSION}"
+    else:
+        stat = os.stat(path)
+        key = f"{stat.st_size}-{stat.st_mtime_ns}"
+    return os.path.join(cache_dir, f"{os.path.basename(path)}.{key}.{suffix}")
+
+def _watermark(path: str, offset: int, rows: int, mtime_ns: int | None = None) -> dict:
+    """Recording how much of path the cache holds: the byte offset, the row count,
+    hashes of the first bytes and of the bytes just before offset, and the source mtime.
+    """
+    with open(path, "rb") as f:
+        head = f.read(min(FINGERPRINT_BYTES, offset))
+        start = max(0, offset - FINGERPRINT_BYTES)
+        f.seek(start)
+        tail = f.read(offset - start)
+    return {
+        "offset": offset,
+        "rows": rows,
+        "head": hashlib.blake2b(head).hexdigest(),
+        "tail": hashlib.blake2b(tail).hexdigest(),
+        "mtime": mtime_ns,
+    }
+
+def _refresh_cache(path: str, cache_path: str, backend: str) -> pd.DataFrame | None:
+    """Reading the cache and ingesting only the complete lines appended since its watermark
+    (a last line still missing its newline is left for a later load).
+    Returns None when the source was truncated or rewritten, so the caller rebuilds.
+    """
+    df, watermark = _read_cache(cache_path)
+    stat = os.stat(path)
+    size = stat.st_size
+    offset = watermark.get("offset")
+
+    #The mtime is left out here: appending changes it, the hashes tell appends from rewrites
+    current = {} if offset is None or size < offset else _watermark(path, offset, len(df))
+    if any(watermark.get(key) != current.get(key) for key in ("offset", "rows", "head", "tail")):
+        print("  Source was truncated or rewritten since it was cached. Rebuilding.")
+        return None
+
+    if size == offset:
+        #Same size but touched since: an in-place edit the head and tail hashes can miss
+        if watermark.get("mtime") != stat.st_mtime_ns:
+            print("  Source was modified since it was cached. Rebuilding.")
+            return None
+        print(f"  Loaded {len(df):,} rows x {len(df.columns)} columns from cache\n")
+        return df
+
+    if _is_compressed(path):
+        #Appended bytes of a compressed file cannot be parsed on their own
+        print("  Compressed source has changed since it was cached. Rebuilding.")
+        return None
+
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read(size - offset)
+    #Stopping after the last newline, so a record still being written is not parsed half-way
+    data = data[:data.rfind(b"\n") + 1]
+    if not data:
+        print(f"  Loaded {len(df):,} rows x {len(df.columns)} columns from cache (no complete new lines)\n")
+        return df
+
+    print(f"  Loaded {len(df):,} cached rows, ingesting {len(data):,} new bytes")
+    new_raw = _parse(None, backend, data=data)
+    new = _clean(new_raw)
+
+    raw_columns = list(dict.fromkeys(_raw_columns(df.columns) + list(new_raw.columns)))
+    df = pd.concat([df, new], ignore_index=True)
+    df = df[_column_order(raw_columns, df.columns)]
+    print(f"  Appended {len(new):,} rows. Final shape: {df.shape}\n")
+
+    _write_cache(df, path, cache_path, _watermark(path, offset + len(data), len(df), stat.st_mtime_ns))
     return df
 
+def _write_cache_file(path: str, cache_path: str, suffix: str, write) -> None:
+    """Calling write(tmp_path) and moving the result into place at cache_path,
+    after removing older cache files with the same suffix for the source path.
+    Writing to a temp file first means an interrupted run never leaves a broken cache.
+    """
+    cache_dir = os.path.dirname(cache_path)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    #Removing stale caches of the same source file. The segment between its name and the suffix
+    #must be a cache key (v<N>, or <size>-<mtime>[.v<N>]), so r.json never matches r.json.gz's caches
+    basename = os.path.basename(path)
+    pattern = f"{glob.escape(basename)}.*.{suffix}"
+    for old in glob.glob(os.path.join(glob.escape(cache_dir), pattern)):
+        key = os.path.basename(old)[len(basename) + 1:-len(suffix) - 1]
+        if re.fullmatch(CACHE_KEY_PATTERN, key):
+            os.remove(old)
+
+    tmp_path = f"{cache_path}.tmp"
+    write(tmp_path)
+    os.replace(tmp_path, cache_path)
+
+def _nested_array(values: pd.Series):
+    """Arrow array for a column of dicts (map<string, value>) or lists (list<item>), missing values null.
+    Returns None for anything else (mixed dicts and lists, values Arrow cannot type).
+    """
+    values = values.tolist()
+    dicts = [value for value in values if isinstance(value, dict)]
+    lists = [value for value in values if isinstance(value, list)]
+    try:
+        if dicts and not lists:
+            items = pa.array([item for value in dicts for item in value.values()])
+            item_type = pa.string() if pa.types.is_null(items.type) else items.type
+            return pa.array(
+                [list(value.items()) if isinstance(value, dict) else None for value in values],
+                type=pa.map_(pa.string(), item_type),
+            )
+        if lists and not dicts:
+            return pa.array([value if isinstance(value, list) else None for value in values])
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        pass
+    return None
+
+def _write_cache(df: pd.DataFrame, path: str, cache_path: str, watermark: dict) -> None:
+    """Writing the cleaned frame and its watermark to an uncompressed Arrow file.
+    Nested columns (style, image) are stored as Arrow map / list columns, or as JSON
+    text when their values do not fit one Arrow type.
+    """
+    nested, as_json = {}, []
+    for col in df.columns:
+        if df[col].dtype == object and df[col].map(lambda x: isinstance(x, (dict, list))).any():
+            array = _nested_array(df[col])
+            if array is None:
+                as_json.append(col)
+            else:
+                nested[col] = array
+
+    out = df.drop(columns=list(nested))
+    for col in as_json:
+        out[col] = out[col].map(json.dumps, na_action="ignore")
+    table = pa.Table.from_pandas(out, preserve_index=False)
+    for position, col in enumerate(df.columns):
+        if col in nested:
+            table = table.add_column(position, col, nested[col])
+    table = table.replace_schema_metadata({
+        **(table.schema.metadata or {}),
+        b"json_columns": json.dumps(as_json).encode(),
+        b"watermark": json.dumps(watermark).encode(),
+    })
+
+    _write_cache_file(
+        path, cache_path, "arrow",
+        lambda tmp_path: feather.write_feather(table, tmp_path, compression="uncompressed"),
+    )
+    print(f"  Cached cleaned data to: {cache_path}\n")
+
+def _read_cache(cache_path: str) -> tuple[pd.DataFrame, dict]:
+    """Memory-mapping the Arrow cache back into a DataFrame. Also returns its watermark.
+    Map columns come back as dicts and list columns as lists, converted by Arrow.
+    """
+    table = feather.read_table(cache_path, memory_map=True)
+    as_json = json.loads(table.schema.metadata.get(b"json_columns", b"[]"))
+    watermark = json.loads(table.schema.metadata.get(b"watermark", b"{}"))
+    df = table.to_pandas(maps_as_pydicts="strict")
+    for field in table.schema:
+        if pa.types.is_list(field.type) or pa.types.is_large_list(field.type):
+            #to_pandas gives numpy arrays, load_data gives lists
+            df[field.name] = pd.Series(table.column(field.name).to_pylist(), dtype=object)
+        elif field.name in as_json:
+            df[field.name] = df[field.name].map(json.loads, na_action="ignore").astype(object)
+        elif not pa.types.is_map(field.type):
+            continue
+        df[field.name] = df[field.name].where(df[field.name].notna(), np.nan)
+    return df, watermark
+
+#================================================================
+#Cleaning
+#================================================================
 def _clean(df: pd.DataFrame) -> pd.DataFrame:
     """Applying type conversions and adding derived columns.
     """
     #Converting ratings to numeric
-    df["overall"] = pd.to_numeric(df.get("overall"), errors="coerce")
+    if "overall" in df.columns:
+        df["overall"] = pd.to_numeric(df["overall"], errors="coerce")
 
     #Converting time / date to datetime
     if "unixReviewTime" in df.columns:
@@ -71,21 +1091,28 @@ def _clean(df: pd.DataFrame) -> pd.DataFrame:
 
     #Unpacking style into flat columns
     if "style" in df.columns:
-        style_df = df["style"].apply(
-            lambda x: {k.strip().rstrip(":"): v.strip()
-                       for k, v in x.items()}
-            if isinstance(x, dict) else {}
-        )
-        expanded_style = pd.json_normalize(style_df)
-        expanded_style.index = df.index
+        df = pd.concat([df, _unpack_style(df["style"])], axis=1)
 
+    return df
+
+def _unpack_style(style: pd.Series) -> pd.DataFrame:
+    """Flattening style dicts into prefixed style_* columns in one pass.
+    Known keys come first in STYLE_KEYS order, unseen keys follow sorted by name.
+    """
+    dicts = [x if isinstance(x, dict) else {} for x in style.tolist()]
+    raw_keys = set().union(*dicts)
+    ordered = [k for k in STYLE_KEYS if k in raw_keys] + sorted(raw_keys.difference(STYLE_KEYS))
+
+    columns = {}
+    for raw_key in ordered:
         #Prefixing style columns to avoid name clashes
-        expanded_style.columns = [
-            f"style_{col}" for col in expanded_style.columns
-        ]
-        df = pd.concat([df, expanded_style], axis=1)
+        name = f"style_{raw_key.strip().rstrip(':')}"
+        values = pd.Series([d.get(raw_key) for d in dicts], index=style.index).str.strip()
 
-    return df
+        #Keys differing only in whitespace share a column
+        columns[name] = values.combine_first(columns[name]) if name in columns else values
+
+    return pd.DataFrame(columns, index=style.index)
 
 
 ##Test block
@@ -0,0 +1,184 @@
+"""
+Content-addressed on-disk cache for preprocessed DataFrames.
+Returns DataFrame
+
+An entry is named after a hash of everything the preprocessed frame depends on:
+the input columns preprocessing reads, the parameters it was called with and
+the source of the modules that produce it. Changing any of them gives a new key,
+so entries are never stale; old ones are simply evicted, least recently used
+first, once the cache holds more than PREPROCESS_CACHE_BYTES.
+
+Entries are uncompressed Arrow files (memory-mapped on read). Token-list columns,
+TokenArrays or Python lists, are stored as their int32 ids and offsets plus the
+vocabulary, and come back in the same form.
+
+Usage (basic_preprocess does this for preprocess_data(..., cache=True)):
+    from preprocess_cache import cache_key, code_version, read_frame, write_frame
+    key = cache_key(df, ["summary", "reviewText"], {"token_ids": True}, code_version(paths))
+    out = read_frame(key)
+    if out is None:
+        out = build(df)
+        write_frame(out, key)
+
+Requires pyarrow; without it nothing is cached.
+"""
+
+#Importing libraries
+import glob
+import hashlib
+import json
+import os
+import numpy as np
+import pandas as pd
+
+#Arrow is optional - without it every lookup misses and nothing is written
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:
+    pa = None
+
+from token_table import TokenArray, TokenDtype, Vocabulary
+
+#================================================================
+#Set Up
+#================================================================
+#Cache directory, shared with the loader and lemma caches
+PREPROCESS_CACHE_DIR = os.path.join(os.path.dirname(__file__), "Data", ".cache")
+
+#Total size of cached frames kept before the least recently used are evicted
+PREPROCESS_CACHE_BYTES = 1 << 30
+
+#Entry file names: preprocessed.<key>.arrow
+CACHE_PREFIX = "preprocessed"
+
+
+#================================================================
+#Keys
+#================================================================
+def code_version(paths) -> str:
+    """
+    Hash of the source files that produce the cached frames.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for path in paths:
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def cache_key(df: pd.DataFrame, columns, params: dict, version: str) -> str:
+    """
+    Hash of the listed input columns of df (names, dtypes and values), params and version.
+    Columns df does not have are keyed as missing.
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(json.dumps([version, len(df), params], sort_keys=True, default=str).encode())
+    for col in columns:
+        if col not in df.columns:
+            digest.update(f"{col}:missing".encode())
+            continue
+        digest.update(f"{col}:{df[col].dtype}".encode())
+        _update_digest(digest, df[col])
+    return digest.hexdigest()
+
+
+def _update_digest(digest, series: pd.Series) -> None:
+    """
+    Feeding a column's values to digest. Arrow-backed strings are hashed as their raw buffers
+    (lengths, bytes and nulls), several times faster than hashing every value separately.
+    """
+    if pa is not None and hasattr(series.array, "__arrow_array__"):
+        array = pa.chunked_array(series.array.__arrow_array__()).combine_chunks()
+        if pa.types.is_string(array.type) or pa.types.is_large_string(array.type):
+            width = np.int64 if pa.types.is_large_string(array.type) else np.int32
+            offsets = np.frombuffer(array.buffers()[1], dtype=width)[array.offset:array.offset + len(array) + 1]
+            digest.update(np.diff(offsets).tobytes())
+            digest.update(memoryview(array.buffers()[2])[offsets[0]:offsets[-1]])
+            digest.update(array.is_null().to_numpy(zero_copy_only=False).tobytes())
+            return
+    digest.update(pd.util.hash_pandas_object(series, index=False).to_numpy().tobytes())
+
+
+#================================================================
+#Reading and writing
+#================================================================
+def _entry_path(key: str, cache_dir: str) -> str:
+    return os.path.join(cache_dir, f"{CACHE_PREFIX}.{key}.arrow")
+
+
+def read_frame(key: str, cache_dir: str = PREPROCESS_CACHE_DIR) -> pd.DataFrame | None:
+    """
+    Cached frame for key, or None on a miss. A hit marks the entry as recently used.
+    """
+    path = _entry_path(key, cache_dir)
+    if pa is None or not os.path.exists(path):
+        return None
+
+    table = feather.read_table(path, memory_map=True)
+    tokens = json.loads(table.schema.metadata.get(b"token_columns", b"{}"))
+    df = table.drop_columns(list(tokens)).to_pandas()
+    for col, info in tokens.items():
+        values = table.column(col).combine_chunks()
+        array = TokenArray(values.values.to_numpy(), values.offsets.to_numpy(), Vocabulary(info["vocab"]))
+        column = pd.Series(array, name=col) if not info["lists"] else pd.Series(array.to_lists(), name=col, dtype=object)
+        df.insert(info["position"], col, column)
+
+    os.utime(path)
+    return df
+
+
+def write_frame(df: pd.DataFrame, key: str, cache_dir: str = PREPROCESS_CACHE_DIR,
+                max_bytes: int = PREPROCESS_CACHE_BYTES) -> None:
+    """
+    Storing df under key, then evicting least recently used entries beyond max_bytes.
+    """
+    if pa is None:
+        return
+    os.makedirs(cache_dir, exist_ok=True)
+
+    #Token-list columns become list<int32> ids; the vocabulary goes in the schema metadata
+    arrays, tokens = {}, {}
+    for position, col in enumerate(df.columns):
+        series = df[col]
+        is_lists = series.dtype == object and len(series) and series.map(lambda x: isinstance(x, list)).all()
+        if isinstance(series.dtype, TokenDtype) or is_lists:
+            array = series.array if isinstance(series.dtype, TokenDtype) else TokenArray.from_lists(series)
+            arrays[col] = pa.LargeListArray.from_arrays(pa.array(array.offsets), pa.array(array.ids))
+            tokens[col] = {"position": position, "lists": bool(is_lists), "vocab": array.vocab.tokens}
+        else:
+            arrays[col] = None
+
+    plain = pd.DataFrame({col: df[col] for col, array in arrays.items() if array is None})
+    table = pa.Table.from_pandas(plain, preserve_index=False)
+    for col in tokens:
+        table = table.append_column(col, arrays[col])
+    table = table.replace_schema_metadata({
+        **(table.schema.metadata or {}),
+        b"token_columns": json.dumps(tokens).encode(),
+    })
+
+    #Writing to a temp file first means an interrupted run never leaves a broken entry
+    path = _entry_path(key, cache_dir)
+    tmp_path = f"{path}.tmp"
+    feather.write_feather(table, tmp_path, compression="uncompressed")
+    os.replace(tmp_path, path)
+    print(f"  Cached preprocessed data to: {path}")
+    evict(cache_dir, max_bytes, keep=path)
+
+
+def evict(cache_dir: str = PREPROCESS_CACHE_DIR, max_bytes: int = PREPROCESS_CACHE_BYTES,
+          keep: str | None = None) -> None:
+    """
+    Removing the least recently used entries until the cache holds at most max_bytes (keep always stays).
+    """
+    entries = glob.glob(os.path.join(glob.escape(cache_dir), f"{CACHE_PREFIX}.*.arrow"))
+    entries.sort(key=lambda path: (path == keep, os.path.getmtime(path)), reverse=True)
+    total = 0
+    for path in entries:
+        size = os.path.getsize(path)
+        if total + size > max_bytes and path != keep:
+            os.remove(path)
+            print(f"  Evicted cached preprocessed data: {os.path.basename(path)}")
+        else:
+            total += size
@@ -1,15 +1,12 @@
 from loader import load_data
-from basic_preprocess import preprocess_data, sample_data
+from basic_preprocess import preprocess_sample
 from Models.swn_model import run_swn_model
 
 #loading the raw data
 raw_df = load_data()
 
-#preprocessing the data
-preprocessed_df = preprocess_data(raw_df)
-
-#creating a 1000-row sample (or however many is possible)
-sampled_df = sample_data(preprocessed_df, n=1000)
+#creating a 1000-row sample (or however many is possible) and preprocessing only those rows
+sampled_df = preprocess_sample(raw_df, n=1000, features=["clean_swn"], cache=True)
 
 #running SWN model
 scored_df = run_swn_model(sampled_df)
@@ -8,18 +8,20 @@ Usage:
 """
 
 import pandas as pd
-import nltk
+import numpy as np
 from nltk.corpus import sentiwordnet as swn
 from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
 from sklearn.metrics import classification_report, accuracy_score
 import os
 
-# Ensure necessary NLTK resources are downloaded for SentiWordNet
-# Adding 'omw-1.4' as it is often required by newer versions of wordnet
-nltk.download(['sentiwordnet', 'wordnet', 'averaged_perceptron_tagger', 'punkt', 'omw-1.4'], quiet=True)
+# Checking (on disk, no downloads) for the NLTK data SentiWordNet needs;
+# a missing corpus fails here with the bootstrap command to run
+from nltk_resources import require
+require('sentiwordnet', 'wordnet')
 
 from loader import load_data
-from basic_preprocess import preprocess_data, sample_data
+from basic_preprocess import preprocess_sample
+from token_table import TokenArray
 
 SEPARATOR = "=" * 64
 
@@ -64,16 +66,22 @@ def run_swn(df):
     """
     print("Running SentiWordNet Lexicon analysis...")
     
+    def get_token_score(token):
+        synsets = list(swn.senti_synsets(token))
+        if synsets:
+            # Using the first (most common) synset score
+            return synsets[0].pos_score() - synsets[0].neg_score()
+        return 0
+
     def get_swn_label(tokens):
         sentiment_score = 0
         # Check if tokens is a valid list (it should be from preprocess_for_swn)
         if isinstance(tokens, list):
             for token in tokens:
-                synsets = list(swn.senti_synsets(token))
-                if synsets:
-                    # Using the first (most common) synset score
-                    sentiment_score += synsets[0].pos_score() - synsets[0].neg_score()
-        
+                sentiment_score += get_token_score(token)
+        return score_to_label(sentiment_score)
+
+    def score_to_label(sentiment_score):
         # Scoring logic
         if sentiment_score > 0: 
             return "Positive"
@@ -82,8 +90,16 @@ def run_swn(df):
         else: 
             return "Neutral"
 
-    # Applying to the 'clean_swn' column which contains lemmatized lists of tokens
-    df['swn_pred'] = df['clean_swn'].apply(get_swn_label)
+    if isinstance(df['clean_swn'].array, TokenArray):
+        # Token ids: scoring each distinct token once, then summing the scores per review
+        tokens = df['clean_swn'].array
+        used = np.unique(tokens.ids)
+        token_scores = np.zeros(len(tokens.vocab))
+        token_scores[used] = [get_token_score(token) for token in tokens.vocab.decode(used)]
+        df['swn_pred'] = [score_to_label(score) for score in tokens.row_sums(token_scores)]
+    else:
+        # Applying to the 'clean_swn' column which contains lemmatized lists of tokens
+        df['swn_pred'] = df['clean_swn'].apply(get_swn_label)
     print("  -> SentiWordNet predictions complete.")
     return df
 
@@ -131,11 +147,10 @@ if __name__ == "__main__":
     # 1. Load the raw data
     df_raw = load_data()
     
-    # 2. Pre-process the entire dataset (cleaning, outlier flagging, target labeling)
-    df_processed = preprocess_data(df_raw)
-    
-    # 3. Randomly sample exactly 1000 reviews for Phase 1 Lexicon Models
-    df_sampled = sample_data(df_processed, n=1000, random_seed=1)
+    # 2. Label, flag outliers and deduplicate the entire dataset, then
+    # 3. Randomly sample exactly 1000 reviews and normalize only those for Phase 1 Lexicon Models
+    #    (cached, so repeated runs skip straight to the models)
+    df_sampled = preprocess_sample(df_raw, n=1000, random_seed=1, cache=True)
     
     # 4. Run Both Lexicon Models
     df_results = run_vader(df_sampled)
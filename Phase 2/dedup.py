@@ -0,0 +1,321 @@
+"""
+Review deduplication beyond preprocess_data's in-memory drop_duplicates:
+near duplicates with MinHash + LSH, and exact duplicates on key hashes across chunks.
+
+Templated and copy-pasted reviews (the same text under several colours or sizes,
+lightly edited) survive exact deduplication. Each review is turned into a set of
+word shingles, summarized by a MinHash signature, and the signatures are bucketed
+by LSH bands, so only reviews that share a bucket are ever compared. Time and
+memory grow linearly with the number of reviews.
+
+Usage:
+    from dedup import find_near_duplicates, near_duplicate_stats
+    clusters = find_near_duplicates(df["combined_text"], threshold=0.8)
+    df["is_near_dup"] = clusters != np.arange(len(clusters))
+    print(near_duplicate_stats(clusters))
+
+Or as a preprocess_data stage:
+    df = preprocess_data(df, near_dups="flag")       #adds near_dup_cluster / is_near_dup
+    df = preprocess_data(df, near_dups="collapse")   #keeps the first review of each cluster
+
+Exact deduplication over a stream, holding only 8 bytes per distinct review:
+    from dedup import SeenHashes, drop_duplicates_hashed
+    seen = SeenHashes()
+    for chunk in load_data_iter(chunksize=100_000):
+        chunk = drop_duplicates_hashed(chunk, ["reviewerID", "reviewText"], seen)
+
+Near-duplicate tuning: reviews become LSH candidates with probability 1 - (1 - J^r)^bands, where
+J is their shingle Jaccard similarity and r = num_perm // bands, so the S-curve
+midpoint (1 / bands) ** (1 / r) should sit a little below threshold. Candidates
+are then kept only when their estimated Jaccard reaches threshold.
+"""
+
+#Importing libraries
+import string
+import numpy as np
+import pandas as pd
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+#================================================================
+#Set Up
+#================================================================
+#Default Jaccard threshold, shingle size (words), bands and signature length
+NEAR_DUP_THRESHOLD = 0.8
+NEAR_DUP_SHINGLE_SIZE = 3
+NEAR_DUP_BANDS = 16
+NEAR_DUP_NUM_PERM = 128
+
+#Reviews hashed per block - bounds the shingle arrays held at once
+NEAR_DUP_BLOCK_SIZE = 20_000
+
+#Translation table deleting ASCII punctuation before shingling
+PUNCT_TABLE = str.maketrans("", "", string.punctuation)
+
+#Multiplier of the rolling shingle hash and seed of the permutation parameters
+SHINGLE_BASE = np.uint64(0x100000001B3)
+MINHASH_SEED = 262
+
+
+def _shingle_hashes(texts: list[str], shingle_size: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    64-bit hashes of each text's word shingles, flattened, plus the CSR offsets per text.
+    Texts shorter than shingle_size become a single shingle of all their words.
+    """
+    words = [text.lower().translate(PUNCT_TABLE).split() for text in texts]
+    lengths = np.fromiter(map(len, words), dtype=np.int64, count=len(words))
+    word_hashes = pd.util.hash_array(
+        np.array([word for row in words for word in row], dtype=object)
+    )
+
+    #Window start positions: every position with a full window, plus the start of short texts
+    starts = np.zeros(len(words), dtype=np.int64)
+    np.cumsum(lengths[:-1], out=starts[1:])
+    ends = starts + lengths
+    n_windows = np.where(lengths >= shingle_size, lengths - shingle_size + 1, np.minimum(lengths, 1))
+    offsets = np.zeros(len(words) + 1, dtype=np.int64)
+    np.cumsum(n_windows, out=offsets[1:])
+    window_text = np.repeat(np.arange(len(words)), n_windows)
+    window_start = starts[window_text] + np.arange(offsets[-1]) - offsets[window_text]
+    window_end = ends[window_text]
+
+    #Rolling polynomial hash over the window (wrapping uint64 arithmetic)
+    padded = np.concatenate([word_hashes, np.zeros(shingle_size, dtype=np.uint64)])
+    hashes = np.zeros(offsets[-1], dtype=np.uint64)
+    for t in range(shingle_size):
+        position = window_start + t
+        word = np.where(position < window_end, padded[position], np.uint64(0))
+        hashes = hashes * SHINGLE_BASE + word
+    return hashes, offsets
+
+
+def _permutations(num_perm: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Parameters of the num_perm hash permutations x -> a * x + b (mod 2**64, a odd).
+    """
+    rng = np.random.default_rng(MINHASH_SEED)
+    a = rng.integers(0, 2**63, size=num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+    b = rng.integers(0, 2**63, size=num_perm, dtype=np.uint64)
+    return a, b
+
+
+def _minhash_block(texts: list[str], shingle_size: int,
+                   a: np.ndarray, b: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    MinHash signatures (texts x num_perm, uint64) of one block, and which texts have any words.
+    """
+    hashes, offsets = _shingle_hashes(texts, shingle_size)
+    signatures = np.zeros((len(texts), len(a)), dtype=np.uint64)
+    has_words = offsets[1:] > offsets[:-1]
+    if has_words.any():
+        segment_starts = offsets[:-1][has_words]
+        for i in range(len(a)):
+            signatures[has_words, i] = np.minimum.reduceat(hashes * a[i] + b[i], segment_starts)
+    return signatures, has_words
+
+
+def _band_hashes(signatures: np.ndarray, bands: int) -> np.ndarray:
+    """
+    One 64-bit bucket key per band (texts x bands).
+    """
+    rows = signatures.shape[1] // bands
+    bands_view = signatures[:, :bands * rows].reshape(len(signatures), bands, rows)
+    keys = np.zeros((len(signatures), bands), dtype=np.uint64)
+    for r in range(rows):
+        keys = (keys ^ bands_view[:, :, r]) * SHINGLE_BASE
+    return keys
+
+
+def _candidate_pairs(keys: np.ndarray, has_words: np.ndarray) -> np.ndarray:
+    """
+    (first, other) pairs of texts sharing an LSH bucket in any band.
+    Each bucket links its members to its first text (a star), so a bucket of
+    m texts gives m - 1 pairs instead of m * (m - 1) / 2.
+    """
+    ids = np.flatnonzero(has_words)
+    pairs = []
+    for band in range(keys.shape[1]):
+        order = ids[np.argsort(keys[ids, band], kind="stable")]
+        sorted_keys = keys[order, band]
+        new_bucket = np.ones(len(order), dtype=bool)
+        new_bucket[1:] = sorted_keys[1:] != sorted_keys[:-1]
+        first = order[np.flatnonzero(new_bucket)[np.cumsum(new_bucket) - 1]]
+        member = ~new_bucket
+        pairs.append(np.column_stack([first[member], order[member]]))
+    return np.unique(np.concatenate(pairs), axis=0)
+
+
+def find_near_duplicates(texts: pd.Series, threshold: float = NEAR_DUP_THRESHOLD,
+                         shingle_size: int = NEAR_DUP_SHINGLE_SIZE, bands: int = NEAR_DUP_BANDS,
+                         num_perm: int = NEAR_DUP_NUM_PERM,
+                         block_size: int = NEAR_DUP_BLOCK_SIZE) -> np.ndarray:
+    """
+    Clusters near-duplicate texts. Returns, for each text, the position of the first
+    text of its cluster (its own position when it has no near duplicate).
+    Texts join a cluster when the MinHash estimate of their word-shingle Jaccard
+    similarity reaches threshold.
+    """
+    if not 0 < threshold <= 1:
+        raise ValueError(f"threshold must be in (0, 1], got {threshold}")
+    if bands < 1 or num_perm < bands:
+        raise ValueError(f"Need 1 <= bands <= num_perm, got bands={bands}, num_perm={num_perm}")
+
+    values = texts.fillna("").astype(str).tolist()
+    n = len(values)
+    if n == 0:
+        return np.empty(0, dtype=np.int64)
+    a, b = _permutations(num_perm)
+
+    #Pass over the corpus in blocks: band keys for bucketing, 16-bit signatures for verification
+    #(b-bit MinHash: truncation raises the chance that two minima agree by only 2**-16)
+    keys = np.empty((n, bands), dtype=np.uint64)
+    signatures = np.empty((n, num_perm), dtype=np.uint16)
+    has_words = np.empty(n, dtype=bool)
+    for start in range(0, n, block_size):
+        block, block_has_words = _minhash_block(values[start:start + block_size], shingle_size, a, b)
+        keys[start:start + len(block)] = _band_hashes(block, bands)
+        signatures[start:start + len(block)] = block.astype(np.uint16)
+        has_words[start:start + len(block)] = block_has_words
+
+    #Verifying candidates against the threshold, in slices to bound the comparison arrays
+    pairs = _candidate_pairs(keys, has_words)
+    keep = np.zeros(len(pairs), dtype=bool)
+    for start in range(0, len(pairs), block_size):
+        left, right = pairs[start:start + block_size].T
+        similarity = (signatures[left] == signatures[right]).mean(axis=1)
+        keep[start:start + block_size] = similarity >= threshold
+    pairs = pairs[keep]
+
+    #Clusters are the connected components of the verified pairs, labelled by their first text
+    graph = coo_matrix((np.ones(len(pairs), dtype=np.int8), (pairs[:, 0], pairs[:, 1])), shape=(n, n))
+    _, labels = connected_components(graph, directed=False)
+    first = np.full(labels.max() + 1, n, dtype=np.int64)
+    np.minimum.at(first, labels, np.arange(n))
+    return first[labels]
+
+
+def near_duplicate_stats(clusters: np.ndarray) -> dict:
+    """
+    Cluster statistics for find_near_duplicates output.
+    """
+    sizes = np.bincount(clusters, minlength=len(clusters))
+    sizes = sizes[sizes > 1]
+    return {
+        "rows": len(clusters),
+        "clusters": len(sizes),
+        "rows_in_clusters": int(sizes.sum()),
+        "near_duplicates": int(sizes.sum() - len(sizes)),
+        "largest": sorted(sizes.tolist(), reverse=True)[:5],
+    }
+
+
+def report_near_duplicates(stats: dict) -> None:
+    """
+    Printing near-duplicate cluster statistics.
+    """
+    rows = max(stats["rows"], 1)
+    print(f"Near duplicates: {stats['clusters']:,} clusters covering {stats['rows_in_clusters']:,} reviews "
+          f"({stats['rows_in_clusters'] / rows:.1%}), {stats['near_duplicates']:,} beyond the first of each")
+    if stats["largest"]:
+        print(f"   Largest clusters: {', '.join(f'{size:,}' for size in stats['largest'])}")
+
+
+#================================================================
+#Hashed exact deduplication
+#================================================================
+#Hash keys (16 characters) of the lower and upper halves of 128-bit hashes
+HASH_KEY_LOW = "0123456789123456"
+HASH_KEY_HIGH = "comp262-dedup128"
+
+
+def dedup_key_hashes(df: pd.DataFrame, subset: list[str], bits: int = 64) -> np.ndarray:
+    """
+    Hashes of each row's dedup key: uint64 for bits=64, 16-byte values for bits=128.
+    The hash keys are fixed, so hashes agree across chunks, processes and runs.
+    """
+    if bits not in (64, 128):
+        raise ValueError(f"bits must be 64 or 128, got {bits}")
+    low = _combined_hash(df, subset, HASH_KEY_LOW)
+    if bits == 64:
+        return low
+    high = _combined_hash(df, subset, HASH_KEY_HIGH)
+    return np.ascontiguousarray(np.column_stack([high, low])).view("V16").ravel()
+
+
+def _combined_hash(df: pd.DataFrame, subset: list[str], hash_key: str) -> np.ndarray:
+    """
+    One uint64 per row over the subset columns. Each column is factorized first, so
+    only its distinct values are hashed (repeated keys are the common case here).
+    """
+    combined = np.zeros(len(df), dtype=np.uint64)
+    for col in subset:
+        codes, uniques = pd.factorize(df[col], use_na_sentinel=False)
+        hashes = pd.util.hash_array(np.asarray(uniques, dtype=object), hash_key=hash_key)
+        combined = (combined * SHINGLE_BASE) ^ hashes[codes]
+    return combined
+
+
+class SeenHashes:
+    """
+    Compact set of the dedup-key hashes seen so far, kept across chunks.
+    Stored as sorted runs (a small LSM tree): each chunk's new hashes form a run and runs
+    of similar size are merged, so a lookup searches O(log n) sorted arrays. Memory is
+    8 bytes per distinct key (16 with bits=128), whatever the length of the reviews.
+
+    Collision rate: two distinct keys share a 64-bit hash with probability 2**-64, so the
+    chance that any review is wrongly dropped among n distinct keys is about n**2 / 2**65
+    (3e-6 for 10 million reviews, 3e-4 for 100 million). bits=128 makes it negligible at
+    any size. benchmark.py dedup checks that the hash collides like a random function.
+    """
+
+    def __init__(self, bits: int = 64):
+        if bits not in (64, 128):
+            raise ValueError(f"bits must be 64 or 128, got {bits}")
+        self.bits = bits
+        self._runs = []
+
+    def __len__(self) -> int:
+        return sum(len(run) for run in self._runs)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(run.nbytes for run in self._runs)
+
+    def add_new(self, hashes: np.ndarray) -> np.ndarray:
+        """
+        Records hashes and returns a mask that is True for the first occurrence of each
+        hash not seen before (in earlier chunks or earlier in this one).
+        """
+        unique, first = np.unique(hashes, return_index=True)
+        new = np.ones(len(unique), dtype=bool)
+        for run in self._runs:
+            positions = np.searchsorted(run, unique)
+            found = positions < len(run)
+            found[found] = run[positions[found]] == unique[found]
+            new &= ~found
+
+        mask = np.zeros(len(hashes), dtype=bool)
+        mask[first[new]] = True
+        if new.any():
+            self._add_run(unique[new])
+        return mask
+
+    def _add_run(self, run: np.ndarray) -> None:
+        """
+        Appending a sorted run, merging while the previous run is at most twice its size.
+        """
+        self._runs.append(run)
+        while len(self._runs) > 1 and len(self._runs[-2]) <= 2 * len(self._runs[-1]):
+            merged = np.concatenate([self._runs.pop(), self._runs.pop()])
+            merged.sort()
+            self._runs.append(merged)
+
+
+def drop_duplicates_hashed(df: pd.DataFrame, subset: list[str],
+                           seen: SeenHashes | None = None) -> pd.DataFrame:
+    """
+    drop_duplicates(subset) on key hashes. Passing the same seen to every chunk of a
+    stream also drops rows whose key appeared in an earlier chunk.
+    """
+    seen = SeenHashes() if seen is None else seen
+    return df.loc[seen.add_new(dedup_key_hashes(df, subset, seen.bits))]
@@ -0,0 +1,187 @@
+"""
+Offline checks and a one-time bootstrap for the NLTK data the lexicon pipelines use.
+Returns None (raises MissingResourceError when data is missing)
+
+Nothing here downloads at import or on first use: modules call require(), which
+only looks for the data on disk and fails straight away with the command to run
+when something is missing. Downloading is a separate, explicit step, run once on
+a machine with network access (or to fill a directory that is then copied to
+air-gapped workers).
+
+Data directory: NLTK_DATA_DIR, taken from the NLTK_DATA environment variable,
+otherwise Data/nltk_data next to this file. It is searched first, before
+NLTK's usual locations (~/nltk_data, /usr/share/nltk_data, ...).
+
+Usage:
+    python nltk_resources.py bootstrap                       # download whatever is missing
+    python nltk_resources.py bootstrap --data-dir /shared/nltk_data
+    python nltk_resources.py check                           # report, no network
+
+    from nltk_resources import require
+    require("sentiwordnet", "wordnet")
+"""
+
+#Importing libraries
+import argparse
+import os
+import sys
+
+#================================================================
+#Set Up
+#================================================================
+#Where bootstrap downloads to and require looks first
+NLTK_DATA_DIR = os.environ.get("NLTK_DATA") or os.path.join(os.path.dirname(__file__), "Data", "nltk_data")
+
+#Resource name -> (nltk.download id, path nltk.data.find looks up). NLTK 3.9+ loads
+#punkt_tab and averaged_perceptron_tagger_eng in place of the pickled punkt and tagger
+RESOURCES = {
+    "sentiwordnet": ("sentiwordnet", "corpora/sentiwordnet"),
+    "wordnet": ("wordnet", "corpora/wordnet"),
+    "omw": ("omw-1.4", "corpora/omw-1.4"),
+    "stopwords": ("stopwords", "corpora/stopwords"),
+    "punkt": ("punkt_tab", "tokenizers/punkt_tab"),
+    "tagger": ("averaged_perceptron_tagger_eng", "taggers/averaged_perceptron_tagger_eng"),
+}
+
+#Resources already found in this process, so repeated require() calls are a set lookup
+_found = set()
+
+
+class MissingResourceError(LookupError):
+    """
+    Raised by require() when NLTK data is not installed locally.
+    """
+
+
+def _use_data_dir(data_dir: str) -> None:
+    """
+    Putting data_dir at the front of NLTK's search path.
+    """
+    import nltk
+    if data_dir in nltk.data.path:
+        nltk.data.path.remove(data_dir)
+    nltk.data.path.insert(0, data_dir)
+
+
+def missing(*names: str, data_dir: str = NLTK_DATA_DIR) -> list[str]:
+    """
+    Which of names (all RESOURCES by default) are not installed, checked on disk only.
+    """
+    import nltk
+    names = names or tuple(RESOURCES)
+    unknown = [name for name in names if name not in RESOURCES]
+    if unknown:
+        raise ValueError(f"Unknown NLTK resources {unknown}, expected any of {list(RESOURCES)}")
+
+    _use_data_dir(data_dir)
+    absent = []
+    for name in names:
+        if name in _found:
+            continue
+        try:
+            nltk.data.find(RESOURCES[name][1])
+        except LookupError:
+            absent.append(name)
+        else:
+            _found.add(name)
+    return absent
+
+
+def require(*names: str, data_dir: str = NLTK_DATA_DIR) -> None:
+    """
+    Making sure NLTK resources are installed locally, without any network access.
+    """
+    if _found.issuperset(names):
+        return
+    absent = missing(*names, data_dir=data_dir)
+    if absent:
+        raise MissingResourceError(
+            f"Missing NLTK data: {', '.join(absent)} (searched {data_dir} and NLTK's default paths). "
+            f"Run once with network access: python nltk_resources.py bootstrap --data-dir {data_dir}"
+        )
+
+
+def _search_paths(data_dir: str) -> list[str]:
+    """
+    data_dir, then the directories NLTK searches by default (NLTK_DATA, ~/nltk_data, system paths).
+    """
+    paths = [data_dir]
+    paths += [os.path.expanduser(d) for d in os.environ.get("NLTK_DATA", "").split(os.pathsep) if d]
+    paths.append(os.path.expanduser("~/nltk_data"))
+    paths += [os.path.join(sys.prefix, "nltk_data"), os.path.join(sys.prefix, "share", "nltk_data"),
+              os.path.join(sys.prefix, "lib", "nltk_data")]
+    if sys.platform.startswith("win"):
+        paths += [os.path.join(os.environ.get("APPDATA", "C:\\"), "nltk_data"),
+                  r"C:\nltk_data", r"D:\nltk_data", r"E:\nltk_data"]
+    else:
+        paths += ["/usr/share/nltk_data", "/usr/local/share/nltk_data",
+                  "/usr/lib/nltk_data", "/usr/local/lib/nltk_data"]
+    return list(dict.fromkeys(paths))
+
+
+def fingerprint(*names: str, data_dir: str = NLTK_DATA_DIR) -> dict:
+    """
+    Name -> "path:bytes:mtime" of each installed resource ("missing" if it is not).
+    Looked up on disk the way nltk.data.find does (unzipped first, then .zip) without
+    importing NLTK. Stands in for a data version: reinstalling or updating a resource changes it.
+    """
+    unknown = [name for name in names if name not in RESOURCES]
+    if unknown:
+        raise ValueError(f"Unknown NLTK resources {unknown}, expected any of {list(RESOURCES)}")
+
+    paths = _search_paths(data_dir)
+    out = {}
+    for name in names:
+        resource = RESOURCES[name][1]
+        found = [os.path.join(d, resource) for d in paths if os.path.isdir(os.path.join(d, resource))]
+        found += [os.path.join(d, f"{resource}.zip") for d in paths if os.path.isfile(os.path.join(d, f"{resource}.zip"))]
+        if not found:
+            out[name] = "missing"
+            continue
+        path = found[0]
+        stats = [os.stat(path)]
+        for root, _, files in os.walk(path):
+            stats.extend(os.stat(os.path.join(root, file)) for file in files)
+        out[name] = f"{path}:{sum(stat.st_size for stat in stats)}:{max(stat.st_mtime_ns for stat in stats)}"
+    return out
+
+
+def bootstrap(*names: str, data_dir: str = NLTK_DATA_DIR) -> None:
+    """
+    Downloading the resources (all RESOURCES by default) not installed yet into data_dir.
+    """
+    import nltk
+    absent = missing(*names, data_dir=data_dir)
+    if not absent:
+        print(f"All NLTK data present ({data_dir} and NLTK's default paths).")
+        return
+
+    os.makedirs(data_dir, exist_ok=True)
+    for name in absent:
+        print(f"Downloading {RESOURCES[name][0]} to {data_dir}")
+        try:
+            nltk.download(RESOURCES[name][0], download_dir=data_dir, quiet=True, raise_on_error=True)
+        except (ValueError, OSError) as error:
+            raise MissingResourceError(f"Download of {RESOURCES[name][0]} to {data_dir} failed: {error}") from error
+    require(*absent, data_dir=data_dir)
+    print(f"Downloaded {len(absent)} NLTK resources.")
+
+
+#================================================================
+#Entry for standalone execution
+#================================================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("command", choices=["check", "bootstrap"])
+    parser.add_argument("names", nargs="*", metavar="name",
+                        help=f"resources, any of {list(RESOURCES)} (default: all)")
+    parser.add_argument("--data-dir", default=NLTK_DATA_DIR)
+    args = parser.parse_args()
+
+    if args.command == "bootstrap":
+        bootstrap(*args.names, data_dir=args.data_dir)
+    else:
+        absent = missing(*args.names, data_dir=args.data_dir)
+        for name in args.names or RESOURCES:
+            print(f"  {name:<14} {'missing' if name in absent else 'ok'}")
+        sys.exit(1 if absent else 0)
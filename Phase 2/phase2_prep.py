@@ -1,14 +1,58 @@
 import pandas as pd
+import numpy as np
+from scipy.sparse import csr_matrix
 from sklearn.model_selection import train_test_split
-from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.feature_extraction.text import TfidfVectorizer, TfidfTransformer
 import os
 
 # Importing modules
 from loader import load_data
 from basic_preprocess import preprocess_data
+from token_table import TokenArray
 
 SEPARATOR = "=" * 64
 
+def tfidf_from_token_ids(X_train, X_test, max_features=5000):
+    """
+    TF-IDF straight from TokenArray ids, without joining tokens back into strings.
+    Gives the same matrices as TfidfVectorizer(max_features=max_features) on the joined text.
+    """
+    train_ids, test_ids = X_train.array, X_test.array
+    if test_ids.vocab is not train_ids.vocab:
+        # Re-encoding the test rows into the training vocabulary
+        test_ids = TokenArray.concat([train_ids[:0], test_ids])
+    vocab = train_ids.vocab
+
+    # Mapping each vocabulary token to the terms TfidfVectorizer's analyzer would pull out of it
+    # (it drops one-letter tokens and splits on non-word characters)
+    analyzer = TfidfVectorizer().build_analyzer()
+    terms, rows, cols = {}, [], []
+    for token_id, token in enumerate(vocab.tokens):
+        for term in analyzer(token):
+            rows.append(token_id)
+            cols.append(terms.setdefault(term, len(terms)))
+    token_terms = csr_matrix((np.ones(len(rows), dtype=np.int64), (rows, cols)),
+                             shape=(len(vocab), len(terms)))
+
+    train_counts = train_ids.count_matrix() @ token_terms
+    test_counts = test_ids.count_matrix() @ token_terms
+
+    # Same feature selection as CountVectorizer: terms seen in training, in alphabetical
+    # order, keeping the max_features most frequent (the same argsort call, so ties match)
+    term_freq = np.asarray(train_counts.sum(axis=0)).ravel()
+    names = np.array(list(terms), dtype=object)
+    seen = np.flatnonzero(term_freq > 0)
+    seen = seen[np.argsort(names[seen])]
+    keep = seen[np.sort((-term_freq[seen]).argsort()[:max_features])]
+
+    X_train_counts = train_counts[:, keep]
+    X_test_counts = test_counts[:, keep]
+    X_train_counts.sort_indices()
+    X_test_counts.sort_indices()
+
+    tfidf = TfidfTransformer()
+    return tfidf.fit_transform(X_train_counts), tfidf.transform(X_test_counts)
+
 def prepare_phase2_data(file_path):
     print(f"\n{SEPARATOR}")
     print("PHASE 2: DATA PREPARATION & SPLITTING")
@@ -18,7 +62,9 @@ def prepare_phase2_data(file_path):
     df_raw = load_data(path=file_path)
 
     # 2. Re-use same phase 1 preprocessing
-    df_clean = preprocess_data(df_raw)
+    # clean_swn is kept as int32 token ids, which TF-IDF consumes directly;
+    # clean_vader is never read here, so it is left lazy; repeated runs start from the cache
+    df_clean = preprocess_data(df_raw, token_ids=True, features=["clean_swn"], cache=True)
 
     # 3. Handle Size Constraint 
     available_rows = len(df_clean)
@@ -43,13 +89,16 @@ def prepare_phase2_data(file_path):
 
     # 5. Requirement 11c: Text Representation (TF-IDF)
     print("\nApplying TF-IDF Text Representation...")
-    X_train_joined = X_train_text.apply(lambda x: " ".join(x) if isinstance(x, list) else x)
-    X_test_joined = X_test_text.apply(lambda x: " ".join(x) if isinstance(x, list) else x)
+    if isinstance(X_train_text.array, TokenArray):
+        X_train_tfidf, X_test_tfidf = tfidf_from_token_ids(X_train_text, X_test_text, max_features=5000)
+    else:
+        X_train_joined = X_train_text.apply(lambda x: " ".join(x) if isinstance(x, list) else x)
+        X_test_joined = X_test_text.apply(lambda x: " ".join(x) if isinstance(x, list) else x)
 
-    tfidf = TfidfVectorizer(max_features=5000) 
-    
-    X_train_tfidf = tfidf.fit_transform(X_train_joined)
-    X_test_tfidf = tfidf.transform(X_test_joined)
+        tfidf = TfidfVectorizer(max_features=5000) 
+        
+        X_train_tfidf = tfidf.fit_transform(X_train_joined)
+        X_test_tfidf = tfidf.transform(X_test_joined)
 
     print("  -> TF-IDF Vectorization Complete.")
     
@@ -0,0 +1,137 @@
+"""
+Streaming, mergeable quantile sketch for single-pass pipelines.
+Returns KLLSketch
+
+A KLL sketch (Karnin, Lang & Liberty) answers quantile queries over a stream while
+holding O(k) values, however many have been added. Sketches built on separate
+chunks or worker processes merge into one with the same error guarantee, so the
+IQR outlier bounds of preprocess_data can come from a first pass over the chunks
+instead of the whole wordCount column.
+
+Usage:
+    from sketch import KLLSketch
+    sketch = KLLSketch()
+    for chunk in chunks:
+        sketch.update(chunk["wordCount"])
+    q1, q3 = sketch.quantiles([0.25, 0.75])
+
+    merged = KLLSketch().merge(sketch_a).merge(sketch_b)
+
+Error bound: a returned q-quantile has true rank within KLL_RANK_ERROR * n of q * n,
+with high probability (benchmark.py sketch tests this on single and merged sketches).
+"""
+
+#Importing libraries
+import numpy as np
+
+#================================================================
+#Set Up
+#================================================================
+#Compactor size: larger k means smaller error and more memory (about 3 * k values)
+KLL_K = 200
+
+#Documented rank error for KLL_K (as a fraction of n), tested in benchmark.py
+KLL_RANK_ERROR = 0.01
+
+#Default compaction seed, so the same inputs always give the same quantiles (and outlier flags)
+KLL_SEED = 0
+
+#Each compactor below the top holds 2/3 as many values as the one above it
+CAPACITY_DECAY = 2 / 3
+
+
+class KLLSketch:
+    """
+    Stack of compactors: a value at level h stands for 2**h inputs. A full level is
+    sorted and every other value (from a random offset) moves up a level, so the
+    total weight stays exactly n while memory stays bounded.
+    """
+
+    def __init__(self, k: int = KLL_K, seed: int | None = KLL_SEED):
+        self.k = k
+        self.n = 0
+        self.levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def __len__(self) -> int:
+        return self.n
+
+    @property
+    def nbytes(self) -> int:
+        return sum(level.nbytes for level in self.levels)
+
+    def update(self, values) -> "KLLSketch":
+        """
+        Adding values (NaNs are skipped).
+        """
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        self.n += len(values)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+        return self
+
+    def merge(self, other: "KLLSketch") -> "KLLSketch":
+        """
+        Folding another sketch into this one.
+        """
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, values in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], values])
+        self.n += other.n
+        self._compress()
+        return self
+
+    def quantiles(self, qs) -> np.ndarray:
+        """
+        Approximate values at quantiles qs (each in [0, 1]).
+        """
+        if self.n == 0:
+            raise ValueError("Quantiles of an empty sketch are undefined")
+        values, cumulative = self._sorted_weights()
+        positions = np.searchsorted(cumulative, np.asarray(qs, dtype=np.float64) * self.n, side="left")
+        return values[np.minimum(positions, len(values) - 1)]
+
+    def quantile(self, q: float) -> float:
+        """
+        Approximate value at quantile q.
+        """
+        return float(self.quantiles([q])[0])
+
+    def rank(self, value: float) -> float:
+        """
+        Approximate fraction of inputs <= value.
+        """
+        values, cumulative = self._sorted_weights()
+        position = np.searchsorted(values, value, side="right")
+        return float(cumulative[position - 1]) / self.n if position else 0.0
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return max(2, int(np.ceil(self.k * CAPACITY_DECAY ** depth)))
+
+    def _compress(self) -> None:
+        """
+        Compacting the lowest over-capacity level until the sketch fits its total capacity.
+        Stopping there (rather than emptying every full level) keeps the upper levels
+        populated, which is where the accuracy on a long stream comes from.
+        """
+        while sum(map(len, self.levels)) > sum(map(self._capacity, range(len(self.levels)))):
+            level = next(h for h in range(len(self.levels)) if len(self.levels[h]) > self._capacity(h))
+            if level + 1 == len(self.levels):
+                self.levels.append(np.empty(0))
+            values = np.sort(self.levels[level])
+            even = len(values) - len(values) % 2
+            offset = self._rng.integers(2)
+            self.levels[level + 1] = np.concatenate([self.levels[level + 1], values[offset:even:2]])
+            self.levels[level] = values[even:]
+
+    def _sorted_weights(self) -> tuple[np.ndarray, np.ndarray]:
+        """
+        All retained values in order, with the cumulative weight up to each.
+        """
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(items), 2.0 ** level) for level, items in enumerate(self.levels)])
+        order = np.argsort(values, kind="stable")
+        return values[order], np.cumsum(weights[order])
@@ -0,0 +1,372 @@
+"""
+Compact integer storage for token-list columns such as clean_swn.
+Returns TokenArray
+
+Every row's tokens are int32 ids into a shared Vocabulary, laid out like a CSR
+matrix: one flat ids array plus an int64 offsets array, so row i is
+ids[offsets[i]:offsets[i + 1]]. That replaces a Python list of strings per row
+with two numpy buffers, which are also cheap to pickle between processes.
+
+TokenArray is a pandas extension array, so it sits in a DataFrame column and
+survives filtering, sample() and train_test_split. Rows are rebuilt as lists of
+strings only when they are read:
+    from token_table import TokenArray
+    tokens = TokenArray.from_lists([["great", "fit"], ["too", "small"]])
+    tokens[1]            #['too', 'small']
+    tokens.row_ids(1)    #array([2, 3], dtype=int32)
+    df["clean_swn"] = pd.Series(tokens, index=df.index)
+
+Consumers that work on ids directly:
+    counts = tokens.count_matrix()          #scipy CSR, rows x vocabulary
+    totals = tokens.row_sums(token_scores)  #per-row sum of a per-vocabulary-id value
+
+Rows compare (==), assign, factorize (unique, duplicated, value_counts) and explode
+like lists of strings, and convert to Arrow as large_list<string>.
+"""
+
+#Importing libraries
+import itertools
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+from pandas.api.extensions import ExtensionArray, ExtensionDtype, register_extension_dtype
+from pandas.api.indexers import check_array_indexer
+from pandas.api.types import is_integer, is_list_like, pandas_dtype
+
+#Arrow is optional - only needed to convert to Arrow (__arrow_array__)
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+
+class Vocabulary:
+    """
+    Token <-> int32 id mapping shared by every TokenArray built from it.
+    Ids are assigned in order of first appearance and never change.
+    """
+
+    def __init__(self, tokens=()):
+        self.tokens = []
+        self.ids = {}
+        self._decoder = np.empty(0, dtype=object)
+        self.encode(tokens)
+
+    def __len__(self) -> int:
+        return len(self.tokens)
+
+    def encode(self, tokens) -> np.ndarray:
+        """
+        Ids of tokens, adding the ones not seen before.
+        """
+        ids = self.ids
+        for token in tokens:
+            if token not in ids:
+                ids[token] = len(self.tokens)
+                self.tokens.append(token)
+        return np.fromiter((ids[token] for token in tokens), dtype=np.int32, count=len(tokens))
+
+    def decode(self, ids: np.ndarray) -> list[str]:
+        """
+        Tokens for an array of ids.
+        """
+        if len(self._decoder) != len(self.tokens):
+            self._decoder = np.array(self.tokens, dtype=object)
+        return self._decoder[ids].tolist()
+
+
+@register_extension_dtype
+class TokenDtype(ExtensionDtype):
+    """
+    pandas dtype of a TokenArray column ("tokens").
+    """
+    name = "tokens"
+    type = list
+
+    @classmethod
+    def construct_array_type(cls):
+        return TokenArray
+
+
+class TokenArray(ExtensionArray):
+    """
+    Token lists stored as int32 vocabulary ids in CSR layout (ids + offsets).
+    """
+
+    def __init__(self, ids: np.ndarray, offsets: np.ndarray, vocab: Vocabulary):
+        self.ids = np.asarray(ids, dtype=np.int32)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.vocab = vocab
+
+    @classmethod
+    def from_lists(cls, token_lists, vocab: Vocabulary | None = None) -> "TokenArray":
+        """
+        Encoding an iterable of token lists (missing rows become empty lists).
+        """
+        token_lists = [row if isinstance(row, list) else _as_list(row) for row in token_lists]
+        vocab = Vocabulary() if vocab is None else vocab
+
+        lengths = np.fromiter(map(len, token_lists), dtype=np.int64, count=len(token_lists))
+        offsets = np.zeros(len(token_lists) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+
+        #Factorizing the flat token stream first so each distinct token hits the vocabulary once
+        flat = np.array(list(itertools.chain.from_iterable(token_lists)), dtype=object)
+        if len(flat) == 0:
+            return cls(np.empty(0, dtype=np.int32), offsets, vocab)
+        codes, uniques = pd.factorize(flat)
+        return cls(vocab.encode(list(uniques))[codes], offsets, vocab)
+
+    #------------------------------------------------------------
+    #Accessors
+    #------------------------------------------------------------
+    def row_ids(self, i: int) -> np.ndarray:
+        """
+        Vocabulary ids of row i (a view, no copy).
+        """
+        return self.ids[self.offsets[i]:self.offsets[i + 1]]
+
+    def lengths(self) -> np.ndarray:
+        """
+        Number of tokens in each row.
+        """
+        return np.diff(self.offsets)
+
+    def to_lists(self) -> list[list[str]]:
+        """
+        Rebuilding every row as a list of strings.
+        """
+        return list(self)
+
+    def count_matrix(self) -> csr_matrix:
+        """
+        Rows x vocabulary token counts, built straight from the ids.
+        """
+        #copy=True: sum_duplicates sorts the indices in place, which must not reorder self.ids
+        counts = csr_matrix(
+            (np.ones(len(self.ids), dtype=np.int64), self.ids, self.offsets),
+            shape=(len(self), len(self.vocab)), copy=True,
+        )
+        counts.sum_duplicates()
+        return counts
+
+    def row_sums(self, values: np.ndarray) -> np.ndarray:
+        """
+        Per-row sum of values[id] over each row's tokens, added left to right.
+        """
+        rows = np.repeat(np.arange(len(self)), self.lengths())
+        return np.bincount(rows, weights=np.asarray(values)[self.ids], minlength=len(self))
+
+    @classmethod
+    def concat(cls, to_concat) -> "TokenArray":
+        """
+        Joining arrays end to end into the first array's vocabulary.
+        """
+        vocab = to_concat[0].vocab
+        #Chunks encoded against another vocabulary are remapped into the first one
+        ids = [
+            array.ids if array.vocab is vocab else vocab.encode(array.vocab.tokens)[array.ids]
+            for array in to_concat
+        ]
+        lengths = np.concatenate([array.lengths() for array in to_concat])
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        return cls(np.concatenate(ids), offsets, vocab)
+
+    #------------------------------------------------------------
+    #pandas ExtensionArray interface
+    #------------------------------------------------------------
+    @classmethod
+    def _from_sequence(cls, scalars, *, dtype=None, copy=False):
+        if isinstance(scalars, TokenArray):
+            return scalars.copy() if copy else scalars
+        return cls.from_lists(scalars)
+
+    @classmethod
+    def _concat_same_type(cls, to_concat):
+        return cls.concat(to_concat)
+
+    @property
+    def dtype(self) -> TokenDtype:
+        return TokenDtype()
+
+    @property
+    def nbytes(self) -> int:
+        #The vocabulary is shared between arrays, so only the two buffers are counted
+        return self.ids.nbytes + self.offsets.nbytes
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, item):
+        if is_integer(item):
+            if not -len(self) <= item < len(self):
+                raise IndexError(f"index {item} is out of bounds for size {len(self)}")
+            item = item + len(self) if item < 0 else item
+            return self.vocab.decode(self.row_ids(item))
+
+        item = check_array_indexer(self, item)
+        if isinstance(item, slice):
+            positions = np.arange(len(self))[item]
+        elif item.dtype == bool:
+            positions = np.flatnonzero(item)
+        else:
+            positions = item
+        return self.take(positions)
+
+    def __iter__(self):
+        tokens = self.vocab.decode(self.ids)
+        bounds = self.offsets.tolist()
+        for start, end in zip(bounds, bounds[1:]):
+            yield tokens[start:end]
+
+    def __array__(self, dtype=None, copy=None):
+        #Filling element by element so numpy never tries to make a 2D array of equal-length rows
+        out = np.empty(len(self), dtype=object)
+        for i, row in enumerate(self):
+            out[i] = row
+        return out
+
+    def astype(self, dtype, copy=True):
+        dtype = pandas_dtype(dtype)
+        if isinstance(dtype, TokenDtype):
+            return self.copy() if copy else self
+        if dtype == object:
+            return self.__array__()
+        return super().astype(dtype, copy=copy)
+
+    def isna(self) -> np.ndarray:
+        return np.zeros(len(self), dtype=bool)
+
+    def take(self, indices, allow_fill=False, fill_value=None) -> "TokenArray":
+        indices = np.asarray(indices, dtype=np.intp)
+        empty = None
+        if allow_fill:
+            if (indices < -1).any():
+                raise ValueError("Invalid value in 'indices', must be all >= -1 when allow_fill is True")
+            #Missing rows (-1) come back as empty token lists
+            empty = indices == -1
+            positions = np.where(empty, 0, indices)
+        else:
+            positions = np.where(indices < 0, indices + len(self), indices)
+        checked = positions if empty is None else positions[~empty]
+        if len(checked) and (checked.min() < 0 or checked.max() >= len(self)):
+            raise IndexError("indices are out-of-bounds")
+
+        starts = np.take(self.offsets, positions, mode="clip")
+        lengths = np.take(self.offsets, positions + 1, mode="clip") - starts
+        if empty is not None:
+            lengths[empty] = 0
+        offsets = np.zeros(len(positions) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+
+        #Gathering every selected token in one shot: each row's run starts at its old offset
+        gather = np.repeat(starts - offsets[:-1], lengths) + np.arange(offsets[-1])
+        return TokenArray(self.ids[gather], offsets, self.vocab)
+
+    def copy(self) -> "TokenArray":
+        return TokenArray(self.ids.copy(), self.offsets.copy(), self.vocab)
+
+    def __eq__(self, other):
+        """
+        Row-wise equality with another TokenArray (or sequence of token lists) of the same
+        length, or with a single token list compared against every row.
+        """
+        if isinstance(other, (pd.Series, pd.Index, pd.DataFrame)):
+            return NotImplemented
+        if isinstance(other, list) and all(isinstance(token, str) for token in other):
+            other = [other] * len(self)
+        elif not is_list_like(other):
+            return np.zeros(len(self), dtype=bool)
+        other = other if isinstance(other, TokenArray) else TokenArray.from_lists(other)
+        if len(other) != len(self):
+            raise ValueError(f"Lengths must match to compare: {len(self)} != {len(other)}")
+
+        #Other's ids in this vocabulary; tokens this vocabulary lacks get -1 and never match
+        ids = other.ids
+        if other.vocab is not self.vocab:
+            mapping = np.array([self.vocab.ids.get(token, -1) for token in other.vocab.tokens], dtype=np.int64)
+            ids = mapping[ids] if len(ids) else ids
+
+        equal = self.lengths() == other.lengths()
+        rows = np.flatnonzero(equal)
+        mine = self.take(rows)
+        theirs = TokenArray(ids, other.offsets, self.vocab).take(rows)
+        mismatched = np.flatnonzero(mine.ids != theirs.ids)
+        equal[rows[np.searchsorted(mine.offsets, mismatched, side="right") - 1]] = False
+        return equal
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else ~equal
+
+    def __setitem__(self, key, value) -> None:
+        """
+        Replacing rows: value is one token list (for every selected row) or one per selected row.
+        """
+        if isinstance(value, list) and all(isinstance(token, str) for token in value):
+            value = [value]
+        values = value if isinstance(value, TokenArray) else TokenArray.from_lists(value)
+
+        key = check_array_indexer(self, key)
+        positions = np.arange(len(self))[key]
+        if np.ndim(positions) == 0:
+            positions = positions.reshape(1)
+        if len(values) != 1 and len(values) != len(positions):
+            raise ValueError(f"Cannot set {len(values)} rows into {len(positions)} positions")
+
+        #Stacking the new rows after the old ones, then taking each position from one or the other
+        order = np.arange(len(self))
+        order[positions] = len(self) + (np.arange(len(positions)) if len(values) != 1 else 0)
+        result = TokenArray.concat([self, values]).take(order)
+        self.ids, self.offsets = result.ids, result.offsets
+
+    def _values_for_factorize(self):
+        #Each row as a hashable tuple of ids; no row is ever missing
+        values = np.empty(len(self), dtype=object)
+        values[:] = [tuple(row) for row in np.split(self.ids, self.offsets[1:-1])] if len(self) else []
+        return values, None
+
+    @classmethod
+    def _from_factorized(cls, values, original):
+        lengths = np.fromiter(map(len, values), dtype=np.int64, count=len(values))
+        offsets = np.zeros(len(values) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        ids = np.fromiter(itertools.chain.from_iterable(values), dtype=np.int32, count=offsets[-1])
+        return cls(ids, offsets, original.vocab)
+
+    def unique(self) -> "TokenArray":
+        values, _ = self._values_for_factorize()
+        return self._from_factorized(pd.unique(values), self)
+
+    def _explode(self):
+        """
+        One entry per token for Series.explode; empty rows give one missing value, as for lists.
+        """
+        lengths = self.lengths()
+        counts = np.maximum(lengths, 1)
+        values = np.full(counts.sum(), np.nan, dtype=object)
+        starts = np.cumsum(counts) - counts
+        values[np.repeat(starts - self.offsets[:-1], lengths) + np.arange(len(self.ids))] = self.vocab.decode(self.ids)
+        return values, counts.astype(np.uint64)
+
+    def __arrow_array__(self, type=None):
+        """
+        Rows as an Arrow large_list<string> (large_list<int32> of ids when type asks for integers).
+        """
+        if type is not None and pa.types.is_integer(type.value_type):
+            values = pa.array(self.ids, type=pa.int32())
+        else:
+            vocab = pa.array(self.vocab.tokens, type=pa.string())
+            values = pa.DictionaryArray.from_arrays(pa.array(self.ids, type=pa.int32()), vocab).dictionary_decode()
+        array = pa.LargeListArray.from_arrays(pa.array(self.offsets, type=pa.int64()), values)
+        return array if type is None else array.cast(type)
+
+
+def _as_list(row) -> list:
+    """
+    Token list for one input row: sequences are copied, missing values become [].
+    """
+    if isinstance(row, (tuple, np.ndarray)):
+        return list(row)
+    return []